@@ -0,0 +1,58 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+import sys
+import timeit
+from typing import Type
+
+from gvm.core import create_core_grammar
+from gvm.language import Grammar, Scanner, DefaultScanner, IndentationScanner
+from gvm.language.helpers import create_combinator_grammar
+from gvm.language.scanner import ParallelScanner
+
+LINES = 5000
+REPEATS = 5
+
+ASCII_LINE = "name: Name [ '<' priority: Integer '>' ]   # comment about this line with words\n"
+MIXED_LINE = "имя: Name [ '<' priority: Integer '>' ]   # комментарий about this line with words\n"
+INDENTATION_BLOCK = """
+def function(first, second):
+    if first:
+        return (first +
+                second)
+
+        # comment
+    else:
+        pass
+"""
+
+
+def benchmark(grammar: Grammar, name: str, content: str, scanner_class: Type[Scanner] = DefaultScanner):
+    count = sum(1 for _ in scanner_class(grammar, name, content))
+    duration = min(timeit.repeat(lambda: list(scanner_class(grammar, name, content)), number=1, repeat=REPEATS))
+    print(f'{name:>8}: {count} tokens in {duration:.4f}s, {count / duration:.0f} tokens/s')
+
+
+def main():
+    grammar = Grammar()
+    grammar.extend(create_core_grammar())
+    grammar.extend(create_combinator_grammar())
+    for implicit in (',', '+', '='):
+        grammar.add_implicit(implicit)
+
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else LINES
+    benchmark(grammar, 'ascii', ASCII_LINE * lines)
+
+    # only one non ASCII character disables fast path of scanner for whole input
+    benchmark(grammar, 'mixed', ASCII_LINE * (lines - 1) + MIXED_LINE)
+    benchmark(grammar, 'unicode', MIXED_LINE * lines)
+    benchmark(grammar, 'indent', INDENTATION_BLOCK * (lines // 8), IndentationScanner)
+
+    # chunks are decreased for splitting of benchmark corpus
+    ParallelScanner.chunk_size = len(ASCII_LINE) * lines // 4
+    benchmark(grammar, 'parallel', ASCII_LINE * lines, ParallelScanner)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+from __future__ import annotations
+
+import itertools
+from typing import FrozenSet, Mapping, TYPE_CHECKING, Sequence
+
+from gvm.language.combinators import Combinator, PostfixCombinator
+
+if TYPE_CHECKING:
+    from gvm.language.grammar import Grammar, TokenID, ParseletID, Parselet
+
+
+class GrammarAnalysis:
+    """
+    This class is contained static analysis of grammar, e.g. nullability and FIRST sets of parselets.
+
+    FIRST set of parselet or combinator is set of tokens that can start it. Nullable parselet or combinator can match
+    empty sequence of tokens.
+
+    Analysis is computed once for grammar and it's invalidated after changes of parselets in grammar.
+    """
+
+    def __init__(self, grammar: Grammar):
+        self.__grammar = grammar
+        self.__nullables = {parser_id: False for parser_id in grammar.parselets.values()}
+        self.__firsts = {parser_id: frozenset() for parser_id in grammar.parselets.values()}
+
+        # fixpoint iteration: nullability and FIRST sets of parselets are only grown at each step
+        changed = True
+        while changed:
+            changed = False
+            for parser_id, table in grammar.tables.items():
+                nullable = False
+                first = set()
+                for parselet in table.parselets:
+                    # postfix parselets of Pratt table can't start it
+                    if isinstance(parselet.combinator, PostfixCombinator):
+                        continue
+                    nullable = nullable or parselet.combinator.is_nullable(self)
+                    first.update(parselet.combinator.get_first(self))
+
+                if nullable != self.__nullables[parser_id] or len(first) != len(self.__firsts[parser_id]):
+                    self.__nullables[parser_id] = nullable
+                    self.__firsts[parser_id] = frozenset(first)
+                    changed = True
+
+    @property
+    def grammar(self) -> Grammar:
+        return self.__grammar
+
+    @property
+    def nullables(self) -> Mapping[ParseletID, bool]:
+        return self.__nullables
+
+    @property
+    def firsts(self) -> Mapping[ParseletID, FrozenSet[TokenID]]:
+        return self.__firsts
+
+    def is_nullable(self, combinator: Combinator) -> bool:
+        """ Returns true, if combinator can match empty sequence of tokens """
+        return combinator.is_nullable(self)
+
+    def get_first(self, combinator: Combinator) -> FrozenSet[TokenID]:
+        """ Returns set of tokens that can start combinator """
+        return combinator.get_first(self)
+
+    def is_disjoint(self, parselets: Sequence[Parselet]) -> bool:
+        """
+        Returns true, if at most one of parselets can be matched at any position, e.g. parselets are not nullable and
+        their FIRST sets are pairwise disjoint. Therefore order of this parselets in choice is not important.
+        """
+        firsts = []
+        for parselet in parselets:
+            if parselet.combinator.is_nullable(self):
+                return False
+            firsts.append(parselet.combinator.get_first(self))
+        return all(lhs.isdisjoint(rhs) for lhs, rhs in itertools.combinations(firsts, 2))
@@ -5,27 +5,36 @@
 from __future__ import annotations
 
 import abc
+import functools
 import itertools
-from typing import Sequence, overload, Iterator, Optional, Union, Type, Tuple, TYPE_CHECKING, Iterable, Mapping
+from typing import Sequence, overload, Iterator, Optional, Union, Type, Tuple, TYPE_CHECKING, Iterable, Mapping, \
+    MutableMapping, FrozenSet, Hashable, Callable
 
 import attr
 
-from gvm.typing import merge_sequence_type, make_optional_type, make_sequence_type, is_sequence_type
+from gvm.typing import merge_sequence_type, make_optional_type, make_sequence_type, is_sequence_type, \
+    merge_choice_type
 from gvm.utils import cached_property
 
 if TYPE_CHECKING:
+    from gvm.language.analysis import GrammarAnalysis
     from gvm.language.grammar import SymbolID, TokenID, ParseletID, Parselet
-from gvm.language.parser import Parser, ParserError
+from gvm.language.parser import Parser, ParserError, ParserCutError
 from gvm.language.syntax import SyntaxToken
 
 CombinatorResult = Tuple[object, Mapping[str, object], Optional[ParserError]]
+CombinatorTransform = Callable[['Combinator'], 'Combinator']
 
 
 # args := [ args:expr { ',' args:expr } [','] ]
 #   args: Sequence[?] = []
+#
+# or with separated combinator:
+#
+# args := { args:expr % ',' % }
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class Combinator(abc.ABC):
     @cached_property
     def variables(self) -> Mapping[str, Type]:
@@ -40,6 +49,25 @@ class Combinator(abc.ABC):
     def clone(self, symbols: Mapping[SymbolID, SymbolID]) -> Combinator:
         raise NotImplementedError
 
+    @property
+    def children(self) -> Sequence[Combinator]:
+        """ Returns nested combinators """
+        return ()
+
+    def transform(self, functor: CombinatorTransform) -> Combinator:
+        """ Returns combinator with nested combinators transformed by functor, or self if they're not changed """
+        return self
+
+    @abc.abstractmethod
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        """ Returns true, if combinator can match empty sequence of tokens """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        """ Returns set of tokens that can start combinator """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
         raise NotImplementedError
@@ -53,15 +81,29 @@ class Combinator(abc.ABC):
         return f'<{class_name}: {self}>'
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class NestedCombinator(Combinator, abc.ABC):
     combinator: Combinator
 
+    @property
+    def children(self) -> Sequence[Combinator]:
+        return (self.combinator,)
+
     def clone(self, symbols: Mapping[SymbolID, SymbolID]) -> Combinator:
         return type(self)(self.combinator.clone(symbols))
 
+    def transform(self, functor: CombinatorTransform) -> Combinator:
+        combinator = functor(self.combinator)
+        return self if combinator is self.combinator else attr.evolve(self, combinator=combinator)
+
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return self.combinator.is_nullable(analysis)
+
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        return self.combinator.get_first(analysis)
 
-@attr.dataclass(frozen=True, repr=False)
+
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class TokenCombinator(Combinator):
     """
     This combinator is match token by it's identifier.
@@ -77,11 +119,17 @@ class TokenCombinator(Combinator):
     def clone(self, symbols: Mapping[SymbolID, SymbolID]) -> Combinator:
         return type(self)(symbols[self.token_id])
 
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return False
+
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        return frozenset((self.token_id,))
+
     def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
         return parser.consume(self.token_id), {}, None
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class ParseletCombinator(Combinator):
     """
     This combinator is match result of call another parselet.
@@ -96,12 +144,18 @@ class ParseletCombinator(Combinator):
     def clone(self, symbols: Mapping[SymbolID, SymbolID]) -> Combinator:
         return type(self)(symbols[self.parser_id], self.priority)
 
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return analysis.nullables[self.parser_id]
+
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        return analysis.firsts[self.parser_id]
+
     def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
         result, error = parser.parselet(self.parser_id, self.priority)
         return result, {}, error
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class CollectionCombinator(Combinator, Sequence[Combinator], abc.ABC):
     """
     Abstract base for all combinators that contains sequence of nested combinators.
@@ -120,11 +174,21 @@ class CollectionCombinator(Combinator, Sequence[Combinator], abc.ABC):
     def __len__(self) -> int:
         return len(self.combinators)
 
+    @property
+    def children(self) -> Sequence[Combinator]:
+        return self.combinators
+
     def clone(self, symbols: Mapping[SymbolID, SymbolID]) -> Combinator:
         return type(self)(tuple(combinator.clone(symbols) for combinator in self.combinators))
 
+    def transform(self, functor: CombinatorTransform) -> Combinator:
+        combinators = tuple(functor(combinator) for combinator in self.combinators)
+        if all(lhs is rhs for lhs, rhs in zip(combinators, self.combinators)):
+            return self
+        return attr.evolve(self, combinators=combinators)
 
-@attr.dataclass(frozen=True, repr=False)
+
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class SequenceCombinator(CollectionCombinator):
     """
     This combinator is match sequence of nested combinators.
@@ -151,11 +215,17 @@ class SequenceCombinator(CollectionCombinator):
 
         return variables
 
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return all(combinator.is_nullable(analysis) for combinator in self.combinators)
+
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        return first_sequence(analysis, self.combinators)
+
     def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
         return sequence(parser, context, self.combinators)
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class PostfixCombinator(SequenceCombinator):
     """
     This combinator is special version of sequence combinator, that ignored first nested combinator.
@@ -163,6 +233,12 @@ class PostfixCombinator(SequenceCombinator):
     Used only for postfix Pratt, e.g. led action
     """
 
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return all(combinator.is_nullable(analysis) for combinator in itertools.islice(self.combinators, 1, None))
+
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        return first_sequence(analysis, itertools.islice(self.combinators, 1, None))
+
     def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
         return sequence(parser, context, itertools.islice(self.combinators, 1, None))
 
@@ -176,7 +252,7 @@ class PostfixCombinator(SequenceCombinator):
         return result, namespace, error
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class NamedCombinator(NestedCombinator):
     name: str
 
@@ -204,7 +280,7 @@ class NamedCombinator(NestedCombinator):
         return result, namespace, error
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class OptionalCombinator(NestedCombinator):
     """
     This combinator is
@@ -220,15 +296,20 @@ class OptionalCombinator(NestedCombinator):
         nested_variables = self.combinator.variables
         return {name: make_optional_type(typ) for name, typ in nested_variables.items()}
 
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return True
+
     def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
-        with parser.backtrack():
-            try:
+        try:
+            with parser.backtrack():
                 return self.combinator(parser, context)
-            except ParserError as error:
-                return None, {}, error
+        except ParserError as error:
+            return None, {}, error
+        except ParserCutError as ex:
+            raise ex.error
 
 
-@attr.dataclass(frozen=True, repr=False)
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
 class RepeatCombinator(NestedCombinator):
     """
     This combinator match zero or more occurrences of nested combinator.
@@ -245,25 +326,290 @@ class RepeatCombinator(NestedCombinator):
         nested_variables = self.combinator.variables
         return {name: make_sequence_type(typ) for name, typ in nested_variables.items()}
 
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return True
+
     def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
         items = []
         error = None
         namespace = {}
         while True:
+            position = parser.position
             try:
                 with parser.backtrack():
                     result, last_namespace, last_error = self.combinator(parser, context)
             except ParserError as last_error:
+                # in recovery mode partially matched element is replaced with error node
+                if parser.recovery and parser.current_token.location.begin < last_error.location.begin:
+                    items.append(parser.recover(last_error))
+                    continue
+
                 error = ParserError.merge(error, last_error)
                 break
+            except ParserCutError as ex:
+                if parser.recovery:
+                    # in recovery mode committed element is replaced with error node. If parser is not moved forward,
+                    # e.g. at end of input, next element is failed at same position and repeat is stopped
+                    tokens = parser.synchronize()
+                    items.append(parser.recover(ex.error, tokens))
+                    if parser.position > position:
+                        continue
+                    break
+
+                raise ParserError.merge(error, ex.error)
             else:
                 error = ParserError.merge(error, last_error)
                 items.append(result)
-                for name, value in last_namespace.items():
-                    namespace[name] = [*namespace[name], *value] if name in namespace else value
+                accumulate_namespace(namespace, last_namespace)
         return tuple(items), namespace, error
 
 
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
+class SeparatedCombinator(NestedCombinator):
+    """
+    This combinator match zero or more occurrences of nested combinator separated by separator combinator, e.g.
+
+        [ item { separator item } [ separator ] ]
+
+    The trailing separator is allowed only if `is_trailing` is true. Elements after the first are matched in single
+    backtrack frame, e.g. without backtrack frame for each element.
+
+    Return sequence of values from nested combinator
+    """
+    separator: Combinator
+    is_trailing: bool = False
+
+    @property
+    def result_type(self) -> Type:
+        return Sequence[self.combinator.result_type]
+
+    @cached_property
+    def variables(self) -> Mapping[str, Type]:
+        variables = {name: make_sequence_type(typ) for name, typ in self.combinator.variables.items()}
+        for name, typ in self.separator.variables.items():
+            variables[name] = merge_sequence_type(variables[name], typ) if name in variables else \
+                make_sequence_type(typ)
+        return variables
+
+    @property
+    def children(self) -> Sequence[Combinator]:
+        return (self.combinator, self.separator)
+
+    def clone(self, symbols: Mapping[SymbolID, SymbolID]) -> Combinator:
+        return type(self)(self.combinator.clone(symbols), self.separator.clone(symbols), self.is_trailing)
+
+    def transform(self, functor: CombinatorTransform) -> Combinator:
+        combinator = functor(self.combinator)
+        separator = functor(self.separator)
+        if combinator is self.combinator and separator is self.separator:
+            return self
+        return attr.evolve(self, combinator=combinator, separator=separator)
+
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return True
+
+    def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
+        namespace = {}
+
+        # first element
+        try:
+            with parser.backtrack():
+                result, last_namespace, error = self.combinator(parser, context)
+        except ParserError as error:
+            return (), namespace, error
+        except ParserCutError as ex:
+            raise ex.error
+        items = [result]
+        accumulate_namespace(namespace, last_namespace)
+
+        # next elements, e.g. separator and element, are matched in single backtrack frame, that is moved after
+        # each matched element
+        separator_namespace = None
+        try:
+            with parser.backtrack():
+                while True:
+                    parser.update_frame()
+                    separator_namespace = None
+                    _, last_namespace, last_error = self.separator(parser, context)
+                    error = ParserError.merge(error, last_error)
+                    separator_namespace = last_namespace
+                    if self.is_trailing:
+                        parser.update_frame()  # trailing separator is kept, if element is not matched
+
+                    result, last_namespace, last_error = self.combinator(parser, context)
+                    error = ParserError.merge(error, last_error)
+                    items.append(result)
+                    accumulate_namespace(namespace, separator_namespace)
+                    accumulate_namespace(namespace, last_namespace)
+        except ParserError as last_error:
+            error = ParserError.merge(error, last_error)
+            if self.is_trailing and separator_namespace is not None:
+                # trailing separator
+                accumulate_namespace(namespace, separator_namespace)
+        except ParserCutError as ex:
+            raise ParserError.merge(error, ex.error)
+
+        return tuple(items), namespace, error
+
+
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
+class ChoiceCombinator(CollectionCombinator):
+    """
+    This combinator is match first successful alternative from nested combinators, e.g. ordered choice.
+
+    Combinator is dispatched alternatives by current token, e.g. it tries only alternatives that can start with current
+    token or can match empty sequence of tokens. Therefore only overlapped alternatives are tried in order.
+
+    If all alternatives raised error it's propagated to up combinator
+    """
+
+    @property
+    def result_type(self) -> Type:
+        return functools.reduce(merge_choice_type, (combinator.result_type for combinator in self.combinators))
+
+    @cached_property
+    def variables(self) -> Mapping[str, Type]:
+        variables = {}
+        for combinator in self.combinators:
+            for name, typ in combinator.variables.items():
+                variables[name] = merge_choice_type(variables[name], typ) if name in variables else typ
+
+        # variable is optional if it's not defined in all alternatives
+        for name, typ in variables.items():
+            if not all(name in combinator.variables for combinator in self.combinators):
+                variables[name] = make_optional_type(typ)
+        return variables
+
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return any(combinator.is_nullable(analysis) for combinator in self.combinators)
+
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        return frozenset(itertools.chain.from_iterable(
+            combinator.get_first(analysis) for combinator in self.combinators
+        ))
+
+    def get_dispatch(self, analysis: GrammarAnalysis) -> ChoiceDispatch:
+        """ Returns dispatch table of alternatives for grammar analysis """
+        dispatch = self.__dict__.get('dispatch')
+        if dispatch is None or dispatch.analysis is not analysis:
+            dispatch = self.__dict__['dispatch'] = ChoiceDispatch.create(analysis, self.combinators)
+        return dispatch
+
+    def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
+        dispatch = self.get_dispatch(parser.grammar.analysis)
+        token = parser.peek(dispatch.first)
+        index = token.id.id
+        combinators = dispatch.table[index] if index < len(dispatch.table) else dispatch.default
+        error = None
+
+        # overlapped alternatives are tried in order
+        for combinator in combinators:
+            try:
+                with parser.backtrack():
+                    result, namespace, last_error = combinator(parser, context)
+                    return result, namespace, ParserError.merge(error, last_error)
+            except ParserError as last_error:
+                error = ParserError.merge(error, last_error)
+            except ParserCutError as ex:
+                raise ParserError.merge(error, ex.error)
+
+        # skipped alternatives are expected current token
+        raise ParserError.merge(error, ParserError(token.location, token.id, set(dispatch.first)))
+
+
+@attr.dataclass(frozen=True)
+class ChoiceDispatch:
+    """ Dispatch table of choice combinator, e.g. alternatives indexed by integer identifier of token """
+    analysis: GrammarAnalysis
+    table: Sequence[Sequence[Combinator]]
+    default: Sequence[Combinator]
+    first: FrozenSet[TokenID]
+
+    @classmethod
+    def create(cls, analysis: GrammarAnalysis, combinators: Sequence[Combinator]) -> ChoiceDispatch:
+        from gvm.language.grammar import make_symbol_table
+
+        firsts = [combinator.get_first(analysis) for combinator in combinators]
+        nullables = [combinator.is_nullable(analysis) for combinator in combinators]
+        first = frozenset(itertools.chain.from_iterable(firsts))
+        default = tuple(combinator for combinator, nullable in zip(combinators, nullables) if nullable)
+        mapping = {
+            token_id: tuple(
+                combinator
+                for combinator, combinator_first, nullable in zip(combinators, firsts, nullables)
+                if nullable or token_id in combinator_first
+            )
+            for token_id in first
+        }
+        return cls(analysis, make_symbol_table(mapping, default), default, first)
+
+
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
+class MemoCombinator(NestedCombinator):
+    """
+    This combinator is memorized result of nested combinator for position, e.g. result, namespace, error and position
+    after nested combinator.
+
+    Used for parse common prefixes of alternatives only once. Memorized results are keyed by combinator itself, e.g.
+    structurally equal memo combinators share them, even if they're not interned in grammar. Hash of combinator is
+    cached, therefore lookup of interned combinator is cheap.
+    """
+
+    @property
+    def result_type(self) -> Type:
+        return self.combinator.result_type
+
+    @cached_property
+    def variables(self) -> Mapping[str, Type]:
+        return self.combinator.variables
+
+    @cached_property
+    def memo_keys(self) -> MutableMapping[Parselet, Hashable]:
+        """ Returns memo keys for contexts, e.g. namespace of nested combinator is depended from types of variables """
+        return {}
+
+    def get_memo_key(self, context: Parselet) -> Hashable:
+        key = self.memo_keys.get(context)
+        if key is None:
+            is_sequences = tuple(is_sequence_type(context.variables[name]) for name in sorted(self.variables))
+            key = self.memo_keys[context] = (self, is_sequences)
+        return key
+
+    def evaluate(self, parser: Parser, context: Parselet) -> CombinatorResult:
+        result, namespace, error = self.combinator(parser, context)
+        return result, freeze_namespace(namespace), error
+
+    def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
+        return parser.memoize(self.get_memo_key(context), self.evaluate, parser, context)
+
+
+@attr.dataclass(frozen=True, repr=False, cache_hash=True)
+class CutCombinator(Combinator):
+    """
+    This combinator is commit current alternative, e.g. enclosing choice doesn't try next alternatives if current
+    alternative is failed after cut.
+
+    Parser releases tokens and memorized results, that can't be used after cut.
+    """
+
+    @property
+    def result_type(self) -> Type:
+        return type(None)
+
+    def clone(self, symbols: Mapping[SymbolID, SymbolID]) -> Combinator:
+        return type(self)()
+
+    def is_nullable(self, analysis: GrammarAnalysis) -> bool:
+        return True
+
+    def get_first(self, analysis: GrammarAnalysis) -> FrozenSet[TokenID]:
+        return frozenset()
+
+    def __call__(self, parser: Parser, context: Parselet) -> CombinatorResult:
+        parser.cut()
+        return None, {}, None
+
+
 def flat_combinator(combinator: Union[Combinator, SymbolID]) -> Combinator:
     from gvm.language.grammar import TokenID, ParseletID
     if isinstance(combinator, TokenID):
@@ -327,6 +673,34 @@ def make_repeat(*combinators: Union[Combinator, SymbolID]) -> Combinator:
     return RepeatCombinator(make_sequence(*combinators))
 
 
+def make_choice(*combinators: Union[Combinator, SymbolID]) -> Combinator:
+    """
+    Helper for create choice combinator.
+
+    If input sequence of combinators contains only one combinator returns it
+    """
+    combinators = tuple(flat_sequence(*combinators, kind=ChoiceCombinator))
+    if len(combinators) == 0:
+        raise ValueError("Can not create choice combinator from empty arguments")
+    return combinators[0] if len(combinators) == 1 else ChoiceCombinator(combinators)
+
+
+def make_memo(*combinators: Union[Combinator, SymbolID]) -> MemoCombinator:
+    """ Helper for create memo combinator """
+    return MemoCombinator(make_sequence(*combinators))
+
+
+def make_cut() -> CutCombinator:
+    """ Helper for create cut combinator """
+    return CutCombinator()
+
+
+def make_separated(combinator: Union[Combinator, SymbolID], separator: Union[Combinator, SymbolID], *,
+                   allow_trailing: bool = False) -> Combinator:
+    """ Helper for create separated combinator """
+    return SeparatedCombinator(flat_combinator(combinator), flat_combinator(separator), allow_trailing)
+
+
 def sequence(parser: Parser, context: Parselet, combinators: Iterable[Combinator]) -> CombinatorResult:
     result = None
     error = None
@@ -338,7 +712,45 @@ def sequence(parser: Parser, context: Parselet, combinators: Iterable[Combinator
             raise ParserError.merge(error, last_error)
         else:
             error = ParserError.merge(error, last_error)
-            for name, value in last_namespace.items():
-                namespace[name] = [*namespace[name], *value] if name in namespace else value
+            accumulate_namespace(namespace, last_namespace)
 
     return result, namespace, error
+
+
+def first_sequence(analysis: GrammarAnalysis, combinators: Iterable[Combinator]) -> FrozenSet[TokenID]:
+    """ Returns set of tokens that can start sequence of combinators """
+    first = set()
+    for combinator in combinators:
+        first.update(combinator.get_first(analysis))
+        if not combinator.is_nullable(analysis):
+            break
+    return frozenset(first)
+
+
+class VariableBuilder(list):
+    """
+    This class is accumulated values of sequence variable in namespace of combinators.
+
+    Builder is owned by namespace, e.g. it's extended in place and it's converted to tuple only once in
+    `Parselet.merge_namespace`.
+    """
+
+
+def accumulate_namespace(namespace: MutableMapping[str, object], other: Mapping[str, object]):
+    """ Merge variables from other namespace to namespace. Values of same variable are accumulated in builder """
+    for name, value in other.items():
+        if name in namespace:
+            builder = namespace[name]
+            if builder.__class__ is not VariableBuilder:
+                builder = namespace[name] = VariableBuilder(builder)
+            builder.extend(value)
+        else:
+            namespace[name] = value
+
+
+def freeze_namespace(namespace: Mapping[str, object]) -> Mapping[str, object]:
+    """ Convert builders in namespace to tuples, e.g. namespace can be shared """
+    return {
+        name: tuple(value) if value.__class__ is VariableBuilder else value
+        for name, value in namespace.items()
+    }
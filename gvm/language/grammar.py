@@ -11,8 +11,8 @@ import enum
 import itertools
 import re
 import sys
-from typing import Mapping, Sequence, Tuple, Optional, Union, Pattern, Match, cast, MutableMapping, Set, FrozenSet, \
-    Type
+from typing import Mapping, Sequence, Tuple, Optional, Union, Pattern, Match, cast, MutableMapping, FrozenSet, \
+    Type, TYPE_CHECKING, TypeVar
 
 import attr
 
@@ -20,20 +20,33 @@ from gvm.exceptions import DiagnosticError
 from gvm.language.actions import ActionGenerator, make_return_result, Action
 from gvm.language.combinators import Combinator, SequenceCombinator, TokenCombinator, ParseletCombinator, \
     flat_combinator, PostfixCombinator, NamedCombinator
-from gvm.language.parser import Parser, ParserError
+from gvm.language.parser import Parser, ParserError, MemoizationMode
 from gvm.language.syntax import SyntaxNode
 from gvm.locations import Location, py_location
 from gvm.typing import make_default_mutable_value, is_sequence_type, is_subclass
 from gvm.utils import camel_case_to_lower, cached_property
 
+if TYPE_CHECKING:
+    from gvm.language.analysis import GrammarAnalysis
+    from gvm.language.optimizer import GrammarOptimizer
+    from gvm.language.scanner import ScannerTable
+
 RE_TOKEN = re.compile('[A-Z][a-zA-Z0-9]*')
 RE_PARSELET = re.compile('[a-z][a-z0-9_]*')
 PRIORITY_MAX = sys.maxsize
 PRIORITY_MIN = 0
 
+T = TypeVar('T')
+
 
 @attr.dataclass(hash=True, order=True, eq=True, frozen=True, repr=False)
 class SymbolID:
+    """
+    Symbol identifier.
+
+    Integer identifier of symbol is unique and dense in grammar, e.g. it's index of symbol in `Grammar.symbols`. It's
+    used for index lookup tables in hot paths of scanner and parser.
+    """
     id: int = attr.attrib(hash=True, order=False, eq=True)
     name: str = attr.attrib(hash=False, order=False, eq=False)
     location: Location = attr.attrib(hash=False, order=False, eq=False, repr=False)
@@ -95,6 +108,10 @@ class Grammar:
         self.__open_brackets = set()
         self.__close_brackets = set()
         self.__bracket_pairs = {}
+        self.__synchronization = set()
+        self.__keywords = {}
+        self.__is_optimized = True
+        self.__combinators = {}
 
         # default tokens
         self.add_token('<EOF>', description='end of file', is_implicit=True)
@@ -140,6 +157,49 @@ class Grammar:
     def bracket_pairs(self) -> Mapping[TokenID, TokenID]:
         return self.__bracket_pairs
 
+    @property
+    def synchronization(self) -> FrozenSet[TokenID]:
+        return cast(FrozenSet[TokenID], self.__synchronization)
+
+    @property
+    def keywords(self) -> Mapping[TokenID, Mapping[str, TokenID]]:
+        """ Returns keywords of identifier-like tokens, e.g. mapping from identifier token to keyword tokens """
+        return self.__keywords
+
+    @cached_property
+    def scanner_table(self) -> ScannerTable:
+        """ Returns compiled patterns of grammar for scanners """
+        from gvm.language.scanner import ScannerTable
+        return ScannerTable(self)
+
+    @property
+    def is_optimized(self) -> bool:
+        """
+        Returns true, if parselets are optimized before parsing, e.g. trivial parselets are inlined and alternatives
+        with common prefix are left factored. Also shadowed token patterns are dropped from scanner table.
+
+        Optimizations can be disabled for debugging.
+        """
+        return self.__is_optimized
+
+    @is_optimized.setter
+    def is_optimized(self, value: bool):
+        self.__is_optimized = value
+        self.__dict__.pop('optimizer', None)  # cleanup grammar optimizer cache
+        self.__dict__.pop('scanner_table', None)  # cleanup scanner table cache
+
+    @cached_property
+    def optimizer(self) -> GrammarOptimizer:
+        """ Returns optimizer of grammar, e.g. optimized parselets that are used by parser """
+        from gvm.language.optimizer import GrammarOptimizer
+        return GrammarOptimizer(self)
+
+    @cached_property
+    def analysis(self) -> GrammarAnalysis:
+        """ Returns static analysis of grammar, e.g. nullability and FIRST sets of parselets """
+        from gvm.language.analysis import GrammarAnalysis
+        return GrammarAnalysis(self)
+
     def add_token(self, name: str, description: str = None, *, is_implicit: bool = False,
                   location: Location = None) -> TokenID:
         location = location or py_location(2)
@@ -152,8 +212,9 @@ class Grammar:
             raise GrammarError(location, f'Already registered symbol id: {name}')
 
         description = description or (name if is_implicit else camel_case_to_lower(name))
-        token_id = TokenID(len(self.__symbols) + 1, name, location, description, is_implicit)
+        token_id = TokenID(len(self.__symbols), name, location, description, is_implicit)
         self.__tokens[name] = self.__symbols[name] = token_id
+        self.__dict__.pop('scanner_table', None)  # cleanup scanner table cache
         return token_id
 
     def add_pattern(self, token_id: TokenID, pattern: str, *, priority: int = PRIORITY_MAX, location: Location = None,
@@ -161,16 +222,42 @@ class Grammar:
         location = location or py_location(2)
         bisect.insort_right(
             self.__patterns, SyntaxPattern(token_id, re.compile(pattern), priority, location, is_implicit))
+        self.__dict__.pop('scanner_table', None)  # cleanup scanner table cache
         return token_id
 
     def add_implicit(self, pattern: str, *, location: Location = None) -> TokenID:
         location = location or py_location(2)
         token_id = self.add_token(pattern, is_implicit=True, location=location)
+        if any(syntax_pattern.token_id == token_id for syntax_pattern in self.__patterns):
+            return token_id  # pattern of implicit token is already registered
         return self.add_pattern(token_id, re.escape(pattern), priority=-len(pattern), location=location,
                                 is_implicit=True)
 
+    def add_keyword(self, token_id: TokenID, keyword: str, *, location: Location = None) -> TokenID:
+        """
+        Add keyword of identifier-like token, e.g. `def` for `Name`.
+
+        Keyword is implicit token, but it's not matched by separate pattern in scanner. Instead of it scanner
+        matches identifier and reclassifies it to keyword by lookup in keywords table.
+
+        :param token_id:    Identifier-like token, patterns of it must match keyword
+        :param keyword:     Content of keyword
+        :param location:    Location of keyword definition
+        :return:            Implicit token for keyword
+        """
+        location = location or py_location(2)
+        matches = (pattern.match(keyword, 0) for pattern in self.__patterns if pattern.token_id == token_id)
+        if not any(match and match.end() == len(keyword) for match in matches):
+            raise GrammarError(location, f'Keyword {keyword!r} is not matched by patterns of token {token_id.name}')
+
+        keyword_id = self.add_implicit(keyword, location=location)
+        self.__keywords.setdefault(token_id, {})[keyword] = keyword_id
+        self.__dict__.pop('scanner_table', None)  # cleanup scanner table cache
+        return keyword_id
+
     def add_trivia(self, token_id: TokenID):
         self.__trivia.add(token_id)
+        self.__dict__.pop('scanner_table', None)  # cleanup scanner table cache
 
     def add_brackets(self, open_id: TokenID, close_id: TokenID):
         """
@@ -186,9 +273,39 @@ class Grammar:
         self.__open_brackets.add(open_id)
         self.__close_brackets.add(close_id)
         self.__bracket_pairs[open_id] = close_id
+        self.__dict__.pop('scanner_table', None)  # cleanup scanner table cache
+
+    def add_synchronization(self, token_id: TokenID):
+        """
+        Add synchronization token.
+
+        Used for error recovery in parser, e.g. parser skips tokens after error to next synchronization token
+
+        :param token_id:
+        :return:
+        """
+        self.__synchronization.add(token_id)
+
+    def intern_combinator(self, combinator: Combinator) -> Combinator:
+        """
+        Returns interned combinator, e.g. structurally equal combinators in grammar share one instance and it's
+        cached properties.
+        """
+        combinator = combinator.transform(self.intern_combinator)
+        return self.__combinators.setdefault(combinator, combinator)
 
     def add_parselet(self, name: str, *, result_type: Type = None, kind: ParseletKind = ParseletKind.Packrat,
-                     location: Location = None) -> ParseletID:
+                     memoization: MemoizationMode = None, location: Location = None) -> ParseletID:
+        """
+        Add parselet to grammar or returns existed parselet.
+
+        :param name:            Name of parselet
+        :param result_type:     Result type of parselet
+        :param kind:            Kind of parselet, e.g. Pratt or Packrat
+        :param memoization:     Memoization mode of parselet. By default results of new parselet are memorized
+        :param location:        Location of parselet definition
+        :return:
+        """
         result_type = result_type or SyntaxNode
         location = location or py_location(2)
         if not RE_PARSELET.match(name):
@@ -199,6 +316,8 @@ class Grammar:
                 raise GrammarError(location, f'Can not define parser {parser_id} with different kind')
             if parser_id.result_type != result_type:
                 raise GrammarError(location, f'Can not define parser {parser_id} with different return type')
+            if memoization is not None:
+                self.__tables[parser_id].memoization = memoization
             return parser_id
         if name in self.__symbols:
             raise GrammarError(location, f'Already registered symbol id: {name}')
@@ -206,8 +325,15 @@ class Grammar:
         parser_id = ParseletID(len(self.__symbols), name, location, kind, result_type)
         self.__parselets[name] = self.__symbols[name] = parser_id
         self.__tables[parser_id] = (PackratTable if kind == ParseletKind.Packrat else PrattTable)(parser_id)
+        self.__tables[parser_id].memoization = memoization or MemoizationMode.On
+        self.__dict__.pop('analysis', None)  # cleanup grammar analysis cache
+        self.__dict__.pop('optimizer', None)  # cleanup grammar optimizer cache
         return parser_id
 
+    def set_memoization(self, parser_id: ParseletID, memoization: MemoizationMode):
+        """ Change memoization mode of existed parselet """
+        self.__tables[parser_id].memoization = memoization
+
     def add_parser(self, parser_id: Union[str, ParseletID], combinator: Union[Combinator, str, SymbolID],
                    generator: ActionGenerator = None, *, priority: int = PRIORITY_MAX, location: Location = None) \
             -> ParseletID:
@@ -218,6 +344,13 @@ class Grammar:
             combinator = make_combinator(self, combinator, location)
         else:
             combinator = flat_combinator(combinator)
+        combinator = self.intern_combinator(combinator)
+
+        # check types of combinator, e.g. types of alternatives must be compatible
+        try:
+            combinator.result_type, combinator.variables
+        except TypeError as ex:
+            raise GrammarError(location, str(ex))
 
         # convert action to combinator action
         generator = generator or make_return_result()
@@ -237,6 +370,8 @@ class Grammar:
 
         # add parser tot table
         self.tables[parser_id].add_parser(combinator, action, priority, location)
+        self.__dict__.pop('analysis', None)  # cleanup grammar analysis cache
+        self.__dict__.pop('optimizer', None)  # cleanup grammar optimizer cache
         return parser_id
 
     def extend(self, grammar: Grammar, *, location: Location = None):
@@ -257,7 +392,12 @@ class Grammar:
         # merge parsers
         for parser_id in grammar.parselets.values():
             try:
-                symbols[parser_id] = self.add_parselet(parser_id.name, kind=parser_id.kind, location=parser_id.location)
+                symbols[parser_id] = self.add_parselet(
+                    parser_id.name,
+                    kind=parser_id.kind,
+                    memoization=grammar.tables[parser_id].memoization,
+                    location=parser_id.location
+                )
             except GrammarError as ex:
                 raise attr.evolve(ex, location=location)
 
@@ -267,7 +407,17 @@ class Grammar:
 
         # merge brackets
         for open_id, close_id in grammar.brackets:
-            self.add_brackets(open_id, close_id)
+            self.add_brackets(cast(TokenID, symbols[open_id]), cast(TokenID, symbols[close_id]))
+
+        # merge synchronization tokens
+        for token_id in grammar.synchronization:
+            self.add_synchronization(cast(TokenID, symbols[token_id]))
+
+        # merge keywords
+        for token_id, keywords in grammar.keywords.items():
+            for keyword, keyword_id in keywords.items():
+                self.__keywords.setdefault(cast(TokenID, symbols[token_id]), {})[keyword] = \
+                    cast(TokenID, symbols[keyword_id])
 
         # merge token patterns
         for pattern in grammar.patterns:
@@ -276,14 +426,50 @@ class Grammar:
                 bisect.insort_right(self.__patterns, SyntaxPattern(
                     token_id, pattern.pattern, pattern.priority, pattern.location, pattern.is_implicit
                 ))
+        self.__dict__.pop('scanner_table', None)  # cleanup scanner table cache
 
         # merge parser tables
         for table in grammar.tables.values():
             parser_id = cast(ParseletID, symbols[table.parser_id])
             new_table: ParseletTable = self.tables[parser_id]
             for parselet in table.parselets:
-                combinator = parselet.combinator.clone(symbols)
+                combinator = self.intern_combinator(parselet.combinator.clone(symbols))
                 new_table.add_parser(combinator, parselet.action, parselet.priority, parselet.location)
+        self.__dict__.pop('analysis', None)  # cleanup grammar analysis cache
+        self.__dict__.pop('optimizer', None)  # cleanup grammar optimizer cache
+
+    def reorder_parselets(self, ordering: Mapping[str, Sequence[int]], *, location: Location = None):
+        """
+        Reorder alternatives of Packrat parselets, e.g. ordering emitted by `gvm.language.profiler.make_ordering`.
+
+        Ordering is mapping from name of parselet to permutation of indexes of it's alternatives. Alternatives can be
+        reordered only among alternatives with same priority and only if it's safe, e.g. alternatives are not
+        nullable and their FIRST sets are disjoint.
+        """
+        location = location or py_location(2)
+        for name, indexes in ordering.items():
+            parser_id = self.__parselets.get(name)
+            if parser_id is None:
+                raise GrammarError(location, f'Not found parselet {name}')
+            table = self.__tables[parser_id]
+            if not isinstance(table, PackratTable):
+                raise GrammarError(location, f'Can not reorder alternatives of Pratt parselet {name}')
+
+            parselets = table.parselets
+            if sorted(indexes) != list(range(len(parselets))):
+                raise GrammarError(location, f'Ordering of parselet {name} is not permutation of it\'s alternatives')
+
+            reordered = [parselets[index] for index in indexes]
+            for _, group in itertools.groupby(reordered, key=lambda parselet: parselet.priority):
+                group = list(group)
+                if len(group) > 1 and not self.analysis.is_disjoint(group):
+                    raise GrammarError(location, f'Can not safely reorder alternatives of parselet {name}')
+            if any(lhs.priority > rhs.priority for lhs, rhs in zip(reordered, reordered[1:])):
+                raise GrammarError(location, f'Ordering of parselet {name} is changed order of priorities')
+
+        for name, indexes in ordering.items():
+            self.__tables[self.__parselets[name]].reorder(indexes)
+        self.__dict__.pop('optimizer', None)  # cleanup grammar optimizer cache
 
     @classmethod
     def merge(cls, *grammars: Grammar, location: Location = None) -> Grammar:
@@ -295,6 +481,14 @@ class Grammar:
         return result
 
 
+def make_symbol_table(mapping: Mapping[SymbolID, T], default: T) -> Sequence[T]:
+    """ Convert mapping from symbols to dense lookup table indexed by integer identifier of symbol """
+    table = [default] * (max((symbol_id.id for symbol_id in mapping), default=-1) + 1)
+    for symbol_id, value in mapping.items():
+        table[symbol_id.id] = value
+    return table
+
+
 # Result of invocation of parselet: optional syntax node with optional last parser error
 ParseletResult = Tuple[Optional[SyntaxNode], Optional[ParserError]]
 
@@ -306,11 +500,21 @@ class ParseletTable(abc.ABC):
         super().__init__()
 
         self.__parser_id = parser_id
+        self.__memoization = MemoizationMode.On
 
     @property
     def parser_id(self) -> ParseletID:
         return self.__parser_id
 
+    @property
+    def memoization(self) -> MemoizationMode:
+        """ Memoization mode of parselet """
+        return self.__memoization
+
+    @memoization.setter
+    def memoization(self, value: MemoizationMode):
+        self.__memoization = value
+
     @property
     @abc.abstractmethod
     def parselets(self) -> Sequence[Parselet]:
@@ -332,6 +536,8 @@ class PrattTable(ParseletTable):
         self.__prefixes = collections.defaultdict(list)
         self.__postfixes = collections.defaultdict(list)
         self.__parselets = []
+        self.__optimizer = None
+        self.__optimized_tables = (), ()
 
     @property
     def parselets(self) -> Sequence[Parselet]:
@@ -346,8 +552,22 @@ class PrattTable(ParseletTable):
         return self.__postfixes
 
     @cached_property
-    def prefix_tokens(self) -> Set[TokenID]:
-        return set(self.prefixes.keys())
+    def prefix_tokens(self) -> FrozenSet[TokenID]:
+        return frozenset(self.prefixes.keys())
+
+    @cached_property
+    def postfix_tokens(self) -> FrozenSet[TokenID]:
+        return frozenset(self.postfixes.keys())
+
+    @cached_property
+    def prefix_table(self) -> Sequence[Sequence[PrefixParselet]]:
+        """ Returns prefix parselets indexed by integer identifier of token """
+        return make_symbol_table(self.prefixes, ())
+
+    @cached_property
+    def postfix_table(self) -> Sequence[Sequence[PostfixParselet]]:
+        """ Returns postfix parselets indexed by integer identifier of token """
+        return make_symbol_table(self.postfixes, ())
 
     def add_parser(self, combinator: Combinator, action: Action, priority: int, location: Location) -> Parselet:
         if isinstance(combinator, SequenceCombinator):
@@ -384,6 +604,8 @@ class PrattTable(ParseletTable):
         bisect.insort_right(self.__prefixes[token_id], parselet)
         bisect.insort_right(self.__parselets, parselet)
         self.__dict__.pop('prefix_tokens', None)  # cleanup prefix tokens cache
+        self.__dict__.pop('prefix_table', None)  # cleanup prefix table cache
+        self.__optimizer = None  # cleanup optimized tables cache
         return parselet
 
     def __add_postfix(self, token_id: TokenID, combinator: SequenceCombinator, action: Action, priority: int,
@@ -393,17 +615,34 @@ class PrattTable(ParseletTable):
                                    location)
         bisect.insort_right(self.__postfixes[token_id], parselet)
         bisect.insort_right(self.__parselets, parselet)
+        self.__dict__.pop('postfix_tokens', None)  # cleanup postfix tokens cache
+        self.__dict__.pop('postfix_table', None)  # cleanup postfix table cache
+        self.__optimizer = None  # cleanup optimized tables cache
         return parselet
 
+    def get_optimized_tables(self, optimizer: GrammarOptimizer) \
+            -> Tuple[Sequence[Sequence[PrefixParselet]], Sequence[Sequence[PostfixParselet]]]:
+        """ Returns optimized prefix and postfix tables that are used by parser """
+        if self.__optimizer is not optimizer:
+            self.__optimized_tables = (
+                [optimizer.optimize_parselets(parselets) for parselets in self.prefix_table],
+                [optimizer.optimize_parselets(parselets) for parselets in self.postfix_table],
+            )
+            self.__optimizer = optimizer
+        return self.__optimized_tables
+
     def __call__(self, parser: Parser, priority: int) -> ParseletResult:
-        parselets = self.prefixes.get(parser.current_token.id, ())
+        prefixes, postfixes = self.get_optimized_tables(parser.optimizer)
+        index = parser.peek(self.prefix_tokens).id.id
+        parselets = prefixes[index] if index < len(prefixes) else ()
         if not parselets:
             raise parser.error(self.prefix_tokens)
         left, error = parser.choice(parselets)
 
         while True:
+            index = parser.peek(self.postfix_tokens).id.id
             parselets = tuple(itertools.takewhile(
-                lambda parselet: priority < parselet.priority, self.postfixes.get(parser.current_token.id, ())
+                lambda parselet: priority < parselet.priority, postfixes[index] if index < len(postfixes) else ()
             ))
             if not parselets:
                 break
@@ -424,18 +663,33 @@ class PackratTable(ParseletTable):
         super().__init__(parser_id)
 
         self.__parselets = []
+        self.__optimizer = None
+        self.__alternatives = ()
 
     @property
     def parselets(self) -> Sequence[Parselet]:
         return self.__parselets
 
+    def get_alternatives(self, optimizer: GrammarOptimizer) -> Sequence[Parselet]:
+        """ Returns optimized parselets that are used by parser, e.g. inlined and left factored parselets """
+        if self.__optimizer is not optimizer:
+            self.__alternatives = optimizer.factor_parselets(optimizer.optimize_parselets(self.__parselets))
+            self.__optimizer = optimizer
+        return self.__alternatives
+
     def add_parser(self, combinator: Combinator, action: Action, priority: int, location: Location) -> Parselet:
         parselet = PrefixParselet(self.parser_id, combinator, action, priority, location)
         bisect.insort_right(self.__parselets, parselet)
+        self.__optimizer = None  # cleanup alternatives cache
         return parselet
 
+    def reorder(self, indexes: Sequence[int]):
+        """ Reorder parselets in table, e.g. `indexes` is permutation of current positions of parselets """
+        self.__parselets = [self.__parselets[index] for index in indexes]
+        self.__optimizer = None  # cleanup alternatives cache
+
     def __call__(self, parser: Parser, priority: int) -> ParseletResult:
-        return parser.choice(self.__parselets)
+        return parser.choice(self.get_alternatives(parser.optimizer))
 
 
 @attr.dataclass(frozen=True, repr=False, order=False, eq=False)
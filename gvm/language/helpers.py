@@ -11,7 +11,7 @@ from gvm.core import create_core_grammar
 from gvm.exceptions import DiagnosticError
 from gvm.language.actions import make_ctor, make_return_variable
 from gvm.language.combinators import make_sequence, make_repeat, make_named, Combinator, make_optional, make_token, \
-    make_parselet
+    make_parselet, make_separated, make_choice, make_cut, make_memo
 from gvm.language.grammar import Grammar
 from gvm.language.parser import Parser
 from gvm.language.scanner import DefaultScanner
@@ -51,11 +51,33 @@ class RepeatNode(CombinatorNode):
     combinator: CombinatorNode
 
 
+@attr.dataclass
+class SeparatedNode(CombinatorNode):
+    combinator: CombinatorNode
+    separator: CombinatorNode
+    trailing: Optional[SyntaxToken] = None
+
+
+@attr.dataclass
+class MemoNode(CombinatorNode):
+    combinator: CombinatorNode
+
+
+@attr.dataclass
+class CutNode(CombinatorNode):
+    value: SyntaxToken
+
+
 @attr.dataclass
 class SequenceNode(CombinatorNode):
     combinators: Sequence[CombinatorNode]
 
 
+@attr.dataclass
+class ChoiceNode(CombinatorNode):
+    combinators: Sequence[CombinatorNode]
+
+
 def create_combinator_grammar() -> Grammar:
     """
     Create grammar for parse combinator definition
@@ -78,10 +100,15 @@ def create_combinator_grammar() -> Grammar:
     curly_close_id = grammar.tokens['}']
     less_id = grammar.tokens['<']
     great_id = grammar.tokens['>']
+    percent_id = grammar.add_implicit('%')
+    pipe_id = grammar.add_implicit('|')
+    tilde_id = grammar.add_implicit('~')
+    at_id = grammar.add_implicit('@')
 
     # parse combinator definition
     comb_id = grammar.add_parselet('combinator', result_type=CombinatorNode)
     seq_id = grammar.add_parselet('combinator_sequence', result_type=SequenceNode)
+    choice_id = grammar.add_parselet('combinator_choice', result_type=ChoiceNode)
 
     # combinator := name: Name ":" combinator=combinator            ; named variable
     grammar.add_parser(
@@ -100,24 +127,45 @@ def create_combinator_grammar() -> Grammar:
     # combinator := value: String                                   ; reference to implicit token
     grammar.add_parser(comb_id, make_named('value', string_id), make_ctor(ImplicitNode))
 
-    # combinator := '[' combinator: combinator_sequence ']'         ; optional combinator
+    # combinator := value: '~'                                      ; cut combinator
+    grammar.add_parser(comb_id, make_named('value', tilde_id), make_ctor(CutNode))
+
+    # combinator := '@' combinator: combinator                     ; memo combinator
+    grammar.add_parser(comb_id, make_sequence(at_id, make_named('combinator', comb_id)), make_ctor(MemoNode))
+
+    # combinator := '[' combinator: combinator_choice ']'           ; optional combinator
     grammar.add_parser(
         comb_id,
-        make_sequence(square_open_id, make_named('combinator', seq_id), square_close_id),
+        make_sequence(square_open_id, make_named('combinator', choice_id), square_close_id),
         make_ctor(OptionalNode)
     )
 
-    # combinator := '{' combinator: combinator_sequence '}'         ; repeat combinator
+    # combinator := '{' combinator: combinator_choice '}'           ; repeat combinator
     grammar.add_parser(
         comb_id,
-        make_sequence(curly_open_id, make_named('combinator', seq_id), curly_close_id),
+        make_sequence(curly_open_id, make_named('combinator', choice_id), curly_close_id),
         make_ctor(RepeatNode)
     )
 
-    # combinator := '(' combinator: combinator_sequence ')'         ; parenthesis combinator
+    # combinator := '{' combinator: combinator_choice '%' separator: combinator_choice [ trailing: '%' ] '}'
+    #                                                               ; separated combinator
+    grammar.add_parser(
+        comb_id,
+        make_sequence(
+            curly_open_id,
+            make_named('combinator', choice_id),
+            percent_id,
+            make_named('separator', choice_id),
+            make_optional(make_named('trailing', percent_id)),
+            curly_close_id
+        ),
+        make_ctor(SeparatedNode)
+    )
+
+    # combinator := '(' combinator: combinator_choice ')'           ; parenthesis combinator
     grammar.add_parser(
         comb_id,
-        make_sequence(parent_open_id, make_named('combinator', seq_id), parent_close_id),
+        make_sequence(parent_open_id, make_named('combinator', choice_id), parent_close_id),
         make_return_variable('combinator')
     )
 
@@ -128,6 +176,17 @@ def create_combinator_grammar() -> Grammar:
         make_ctor(SequenceNode)
     )
 
+    # combinator_choice := combinators:combinator_sequence combinators:{ '|' combinator_sequence }
+    #                                                               ; choice combinator
+    grammar.add_parser(
+        choice_id,
+        make_sequence(
+            make_named('combinators', seq_id),
+            make_named('combinators', make_repeat(pipe_id, seq_id))
+        ),
+        make_ctor(ChoiceNode)
+    )
+
     return grammar
 
 
@@ -137,18 +196,30 @@ combinator_grammar = create_combinator_grammar()
 def parse_combinator(content: str):
     scanner = DefaultScanner(combinator_grammar, '<example>', content)
     parser = Parser(scanner)
-    return parser.parse(combinator_grammar.parselets['combinator_sequence'])
+    return parser.parse(combinator_grammar.parselets['combinator_choice'])
 
 
 def convert_node(grammar: Grammar, node: CombinatorNode, location: Location) -> Combinator:
     if isinstance(node, SequenceNode):
         return make_sequence(*(convert_node(grammar, child, location) for child in node.combinators))
+    if isinstance(node, ChoiceNode):
+        return make_choice(*(convert_node(grammar, child, location) for child in node.combinators))
     if isinstance(node, RepeatNode):
         return make_repeat(convert_node(grammar, node.combinator, location))
+    if isinstance(node, SeparatedNode):
+        return make_separated(
+            convert_node(grammar, node.combinator, location),
+            convert_node(grammar, node.separator, location),
+            allow_trailing=bool(node.trailing)
+        )
     if isinstance(node, OptionalNode):
         return make_optional(convert_node(grammar, node.combinator, location))
     if isinstance(node, NamedNode):
         return make_named(node.name.value, convert_node(grammar, node.combinator, location))
+    if isinstance(node, MemoNode):
+        return make_memo(convert_node(grammar, node.combinator, location))
+    if isinstance(node, CutNode):
+        return make_cut()
     if isinstance(node, ImplicitNode):
         token_id = grammar.add_implicit(ast.literal_eval(node.value.value), location=location)
         return make_token(token_id)
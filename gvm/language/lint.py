@@ -0,0 +1,409 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+from __future__ import annotations
+
+import enum
+import itertools
+import math
+import time
+from typing import Sequence, Iterator, Iterable, List, Set, FrozenSet, Optional, Tuple, Pattern, Callable
+
+import attr
+
+from gvm.language.combinators import Combinator, RepeatCombinator, SeparatedCombinator, ChoiceCombinator, \
+    ParseletCombinator, NamedCombinator, PostfixCombinator
+from gvm.language.grammar import Grammar, Parselet, ParseletID, PackratTable, PrattTable, TokenID, SyntaxPattern
+from gvm.language.optimizer import get_elements, get_common_prefix, is_factorable
+from gvm.language.parser import MemoizationMode
+from gvm.language.scanner import sre_parse, sre_constants, PatternItem, REPEAT_OPERATORS, ATOMIC_GROUP, \
+    get_pattern_literal, find_shadowed_patterns
+from gvm.locations import Location
+
+
+class LintKind(enum.Enum):
+    OverlappedAlternatives = 'overlapped-alternatives'
+    NullableRepeat = 'nullable-repeat'
+    UnreachableParselet = 'unreachable-parselet'
+    Rescanning = 'rescanning'
+    CatastrophicPattern = 'catastrophic-pattern'
+    ShadowedPattern = 'shadowed-pattern'
+
+
+# Function, that returns time of match of pattern on content
+PatternTimer = Callable[[Pattern, str], float]
+
+# Minimal count of measurements, that are used for fitting of exponent of growth
+GROWTH_POINTS = 3
+
+
+@attr.dataclass(frozen=True)
+class LintWarning:
+    """
+    The LintWarning class is represented a possible performance problem in grammar, found by static analysis.
+
+    Attributes:
+        kind      - The warning's kind.
+        location  - The location at which the warning applies, e.g. location of parselet.
+        message   - The warning's message.
+        parselets - Parselets that are involved in problem.
+        patterns  - Token patterns that are involved in problem.
+    """
+    kind: LintKind
+    location: Location
+    message: str
+    parselets: Sequence[Parselet] = ()
+    patterns: Sequence[SyntaxPattern] = ()
+
+
+def lint_grammar(grammar: Grammar, start: Iterable[ParseletID] = (), *, timer: Optional[PatternTimer] = None) \
+        -> Sequence[LintWarning]:
+    """
+    Static analysis of grammar for rules, that can cause heavy backtracking:
+
+    - alternatives with overlapped FIRST sets, e.g. parser must try all of them
+    - repeats of nullable combinators, e.g. potential infinite loops
+    - parselets, that are unreachable from start parselets
+    - overlapped alternatives, that are rescanned same not memoized parselet at same position
+    - token patterns with super-linear backtracking
+    - token patterns, that never win longest match in scanner
+
+    :param timer:   Function for measurement of time of match, e.g. for deterministic analysis
+    """
+    warnings = []
+    warnings.extend(find_overlapped_alternatives(grammar))
+    warnings.extend(find_nullable_repeats(grammar))
+    warnings.extend(find_unreachable_parselets(grammar, start))
+    warnings.extend(find_rescanning_parselets(grammar))
+    warnings.extend(find_catastrophic_patterns(grammar, timer=timer))
+    warnings.extend(find_dead_patterns(grammar))
+    return warnings
+
+
+def iter_combinators(combinator: Combinator) -> Iterator[Combinator]:
+    """ Returns combinator and all nested combinators in pre-order """
+    yield combinator
+    for child in combinator.children:
+        yield from iter_combinators(child)
+
+
+def iter_alternatives(grammar: Grammar) -> Iterator[Sequence[Parselet]]:
+    """
+    Returns groups of alternatives, that are tried by parser in order at same position, e.g. all alternatives of
+    Packrat parselet or prefix and postfix alternatives for same token in Pratt parselet.
+    """
+    for table in grammar.tables.values():
+        if isinstance(table, PackratTable):
+            yield table.parselets
+        elif isinstance(table, PrattTable):
+            yield from table.prefixes.values()
+            yield from table.postfixes.values()
+
+
+def find_overlapped_alternatives(grammar: Grammar) -> Sequence[LintWarning]:
+    """ Find alternatives of parselets and choice combinators with overlapped FIRST sets """
+    analysis = grammar.analysis
+    warnings = []
+    for parselets in iter_alternatives(grammar):
+        for lhs, rhs in itertools.combinations(parselets, 2):
+            # first element of postfix combinator is left operand, e.g. it's already parsed
+            overlapped = get_parselet_first(grammar, lhs) & get_parselet_first(grammar, rhs)
+            if overlapped:
+                names = ', '.join(sorted(token_id.name for token_id in overlapped))
+                warnings.append(LintWarning(
+                    LintKind.OverlappedAlternatives,
+                    rhs.location,
+                    f'Alternatives of parselet {rhs.parser_id.name} have overlapped FIRST sets: {names}',
+                    (lhs, rhs)
+                ))
+
+    for parselet in iter_parselets(grammar):
+        for combinator in iter_combinators(parselet.combinator):
+            if not isinstance(combinator, ChoiceCombinator):
+                continue
+            for lhs, rhs in itertools.combinations(combinator.combinators, 2):
+                overlapped = lhs.get_first(analysis) & rhs.get_first(analysis)
+                if overlapped:
+                    names = ', '.join(sorted(token_id.name for token_id in overlapped))
+                    warnings.append(LintWarning(
+                        LintKind.OverlappedAlternatives,
+                        parselet.location,
+                        f'Alternatives of choice in parselet {parselet.parser_id.name} have overlapped FIRST sets: '
+                        f'{names}',
+                        (parselet,)
+                    ))
+    return warnings
+
+
+def find_nullable_repeats(grammar: Grammar) -> Sequence[LintWarning]:
+    """ Find repeats of nullable combinators, e.g. `{ [ Name ] }` """
+    analysis = grammar.analysis
+    warnings = []
+    for parselet in iter_parselets(grammar):
+        for combinator in iter_combinators(parselet.combinator):
+            if isinstance(combinator, SeparatedCombinator):
+                is_nullable = combinator.combinator.is_nullable(analysis) and combinator.separator.is_nullable(analysis)
+            elif isinstance(combinator, RepeatCombinator):
+                is_nullable = combinator.combinator.is_nullable(analysis)
+            else:
+                continue
+
+            if is_nullable:
+                warnings.append(LintWarning(
+                    LintKind.NullableRepeat,
+                    parselet.location,
+                    f'Repeat in parselet {parselet.parser_id.name} can match empty sequence of tokens',
+                    (parselet,)
+                ))
+    return warnings
+
+
+def find_unreachable_parselets(grammar: Grammar, start: Iterable[ParseletID]) -> Sequence[LintWarning]:
+    """ Find parselets, that are unreachable from start parselets. If start parselets are empty nothing is found """
+    queue: List[ParseletID] = list(start)
+    if not queue:
+        return []
+
+    reachable: Set[ParseletID] = set(queue)
+    while queue:
+        for parselet in grammar.tables[queue.pop()].parselets:
+            for combinator in iter_combinators(parselet.combinator):
+                if isinstance(combinator, ParseletCombinator) and combinator.parser_id not in reachable:
+                    reachable.add(combinator.parser_id)
+                    queue.append(combinator.parser_id)
+
+    return [
+        LintWarning(LintKind.UnreachableParselet, parser_id.location, f'Parselet {parser_id.name} is unreachable')
+        for parser_id in grammar.parselets.values() if parser_id not in reachable
+    ]
+
+
+def find_rescanning_parselets(grammar: Grammar) -> Sequence[LintWarning]:
+    """
+    Find overlapped alternatives, that are started with call of same not memoized parselet and can't be left factored.
+    In worst case this parselet is parsed again for each alternative, and recursively for each nested call.
+    """
+    warnings = []
+    for parselets in iter_alternatives(grammar):
+        for lhs, rhs in itertools.combinations(parselets, 2):
+            if isinstance(lhs.combinator, PostfixCombinator):
+                continue
+
+            lhs_elements = get_elements(lhs.combinator)
+            rhs_elements = get_elements(rhs.combinator)
+            parser_id = get_leading_parselet(lhs_elements[0])
+            if parser_id is None or parser_id != get_leading_parselet(rhs_elements[0]):
+                continue
+            if grammar.tables[parser_id].memoization != MemoizationMode.Off:
+                continue
+            if grammar.is_optimized and is_factorable(get_common_prefix(lhs_elements, rhs_elements), (lhs, rhs)):
+                continue
+
+            warnings.append(LintWarning(
+                LintKind.Rescanning,
+                rhs.location,
+                f'Alternatives of parselet {rhs.parser_id.name} are rescanned not memoized parselet {parser_id.name}',
+                (lhs, rhs)
+            ))
+    return warnings
+
+
+def find_catastrophic_patterns(grammar: Grammar, *, max_length: int = 4096, min_time: float = 1e-4,
+                               max_exponent: float = 1.5, timer: Optional[PatternTimer] = None) \
+        -> Sequence[LintWarning]:
+    """
+    Find token patterns with super-linear backtracking. Each pattern is checked by timing of match on adversarial
+    inputs with growing length, e.g. input with repeated sample of quantified sub-pattern and not matched tail:
+
+        (a+)+b  ->  'aaaaaaaa\0', 'aaaaaaaaaaaa\0', ...
+
+    Pattern is reported, if time of match is grown faster than `n ** max_exponent`.
+
+    :param max_length:      Maximal length of adversarial input
+    :param min_time:        Minimal time of match, that is measured reliably
+    :param max_exponent:    Maximal exponent of growth of time
+    :param timer:           Function for measurement of time of match, by default wall-clock time is used
+    """
+    timer = timer or measure_match_time
+    warnings = []
+    for pattern in grammar.patterns:
+        if get_pattern_literal(pattern.pattern) is not None:
+            continue
+
+        items = sre_parse.parse(pattern.pattern.pattern, pattern.pattern.flags)
+        for prefix, pump in dict.fromkeys(iter_pattern_pumps(items)):
+            exponent = measure_pattern_growth(pattern.pattern, prefix, pump, max_length, min_time, timer)
+            if exponent is not None and exponent > max_exponent:
+                warnings.append(LintWarning(
+                    LintKind.CatastrophicPattern,
+                    pattern.location,
+                    f'Pattern of token {pattern.token_id.name} has super-linear backtracking, e.g. time of match is '
+                    f'grown as n ** {exponent:.1f} on input {prefix!r} + {pump!r} * n',
+                    patterns=(pattern,)
+                ))
+                break
+    return warnings
+
+
+def find_dead_patterns(grammar: Grammar) -> Sequence[LintWarning]:
+    """ Find token patterns, that never win longest match in scanner. This patterns are dropped by optimized grammar """
+    patterns = grammar.patterns
+    return [
+        LintWarning(
+            LintKind.ShadowedPattern,
+            patterns[index].location,
+            f'Pattern of token {patterns[index].token_id.name} is shadowed by pattern of token '
+            f'{patterns[other_index].token_id.name}',
+            patterns=(patterns[other_index], patterns[index])
+        )
+        for index, other_index in find_shadowed_patterns(patterns).items()
+    ]
+
+
+def measure_pattern_growth(pattern: Pattern, prefix: str, pump: str, max_length: int, min_time: float,
+                           timer: Optional[PatternTimer] = None) -> Optional[float]:
+    """
+    Returns exponent of growth of time of match on adversarial input, or None if time of match is too small for
+    measurement or is not grown on each step.
+
+    Exponent is fitted by least squares in log-log scale over last measurements. After first reliable measurement
+    length of input is grown slowly, because time of match of exponential pattern is exploded on each step.
+    """
+    timer = timer or measure_match_time
+    count = 8
+    points: List[Tuple[float, float]] = []
+    while len(prefix) + len(pump) * count < max_length:
+        content = prefix + pump * count + '\0'
+        elapsed = min(timer(pattern, content) for _ in range(3))
+        if elapsed >= min_time:
+            if points and elapsed <= math.exp(points[-1][1]):
+                return None
+
+            points.append((math.log(count), math.log(elapsed)))
+            if len(points) >= GROWTH_POINTS:
+                return fit_exponent(points)
+            count += max(count // 4, 1)
+        else:
+            count = count * 3 // 2
+    return None
+
+
+def fit_exponent(points: Sequence[Tuple[float, float]]) -> float:
+    """ Returns slope of least squares line for points """
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    return covariance / variance
+
+
+def measure_match_time(pattern: Pattern, content: str) -> float:
+    start = time.perf_counter()
+    pattern.match(content)
+    return time.perf_counter() - start
+
+
+def iter_pattern_pumps(items: Sequence[PatternItem], prefix: str = '') -> Iterator[Tuple[str, str]]:
+    """
+    Returns adversarial inputs for parsed regular expression, e.g. pairs of sample of prefix before unbounded
+    quantifier and sample of quantified sub-pattern.
+    """
+    for op, av in items:
+        if op in REPEAT_OPERATORS:
+            pump = get_pattern_sample(av[2])
+            if pump and av[1] > 1:
+                yield prefix, pump
+            yield from iter_pattern_pumps(av[2], prefix)
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                yield from iter_pattern_pumps(branch, prefix)
+        elif op is sre_constants.SUBPATTERN:
+            yield from iter_pattern_pumps(av[-1], prefix)
+        elif op is ATOMIC_GROUP:
+            yield from iter_pattern_pumps(av, prefix)
+
+        sample = get_pattern_sample([(op, av)])
+        if sample is None:
+            return
+        prefix += sample
+
+
+# Characters that are used for samples of regular expressions
+SAMPLE_ALPHABET = 'a0 _-.,:;!?"\'\\/\n\tzZ9xX'
+
+SAMPLE_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: str.isdigit,
+    sre_constants.CATEGORY_NOT_DIGIT: lambda char: not char.isdigit(),
+    sre_constants.CATEGORY_SPACE: str.isspace,
+    sre_constants.CATEGORY_NOT_SPACE: lambda char: not char.isspace(),
+    sre_constants.CATEGORY_WORD: lambda char: char.isalnum() or char == '_',
+    sre_constants.CATEGORY_NOT_WORD: lambda char: not (char.isalnum() or char == '_'),
+    sre_constants.CATEGORY_LINEBREAK: lambda char: char == '\n',
+    sre_constants.CATEGORY_NOT_LINEBREAK: lambda char: char != '\n',
+}
+
+
+def get_pattern_sample(items: Sequence[PatternItem]) -> Optional[str]:
+    """ Returns short string, that is matched by parsed regular expression, or None if sample is not found """
+    result = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            sample = chr(av)
+        elif op is sre_constants.NOT_LITERAL:
+            sample = next((char for char in SAMPLE_ALPHABET if ord(char) != av), None)
+        elif op is sre_constants.ANY:
+            sample = 'a'
+        elif op is sre_constants.IN:
+            sample = next((char for char in SAMPLE_ALPHABET if is_sample_in_set(char, av)), None)
+        elif op is sre_constants.BRANCH:
+            sample = next((sample for sample in map(get_pattern_sample, av[1]) if sample is not None), None)
+        elif op is sre_constants.SUBPATTERN:
+            sample = get_pattern_sample(av[-1])
+        elif op is ATOMIC_GROUP:
+            sample = get_pattern_sample(av)
+        elif op in REPEAT_OPERATORS:
+            sample = get_pattern_sample(av[2])
+            sample = sample * av[0] if sample is not None else None
+        else:
+            sample = ''  # anchors, lookarounds and group references are ignored
+        if sample is None:
+            return None
+        result.append(sample)
+    return ''.join(result)
+
+
+def is_sample_in_set(char: str, items: Sequence[PatternItem]) -> bool:
+    """ Returns true, if character is matched by set of parsed regular expression, e.g. `[^\\W\\d]` """
+    is_negate = False
+    is_matched = False
+    for op, av in items:
+        if op is sre_constants.NEGATE:
+            is_negate = True
+        elif op is sre_constants.LITERAL:
+            is_matched = is_matched or ord(char) == av
+        elif op is sre_constants.RANGE:
+            is_matched = is_matched or av[0] <= ord(char) <= av[1]
+        elif op is sre_constants.CATEGORY and av in SAMPLE_CATEGORIES:
+            is_matched = is_matched or SAMPLE_CATEGORIES[av](char)
+    return is_matched != is_negate
+
+
+def iter_parselets(grammar: Grammar) -> Iterator[Parselet]:
+    for table in grammar.tables.values():
+        yield from table.parselets
+
+
+def get_parselet_first(grammar: Grammar, parselet: Parselet) -> FrozenSet[TokenID]:
+    """ Returns FIRST set of parselet. FIRST set of postfix parselet is started after left operand """
+    combinator = parselet.combinator
+    if isinstance(combinator, PostfixCombinator):
+        combinator = combinator.combinators[1]
+    return combinator.get_first(grammar.analysis)
+
+
+def get_leading_parselet(combinator: Combinator) -> Optional[ParseletID]:
+    """ Returns parselet that is called first in combinator, e.g. `name:expr` """
+    if isinstance(combinator, NamedCombinator):
+        combinator = combinator.combinator
+    return combinator.parser_id if isinstance(combinator, ParseletCombinator) else None
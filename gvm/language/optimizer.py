@@ -0,0 +1,213 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+from __future__ import annotations
+
+from typing import Sequence, Tuple, Optional, List, Mapping, MutableMapping
+
+import attr
+
+from gvm.language.actions import ReturnResultAction
+from gvm.language.combinators import Combinator, SequenceCombinator, CutCombinator, make_sequence, \
+    accumulate_namespace, freeze_namespace, TokenCombinator, ParseletCombinator
+from gvm.language.grammar import Parselet, ParseletResult, Grammar, ParseletID, PackratTable
+from gvm.language.parser import Parser, ParserError
+from gvm.typing import is_sequence_type
+
+
+class GrammarOptimizer:
+    """
+    This class is contained optimizations of parselets in grammar, that are used by parser:
+
+    - trivial parselets are inlined to combinators of callers, e.g. parselet with single alternative, that returns
+      result of token or another parselet
+    - alternatives with common prefix are left factored
+
+    Optimizer is created once for grammar and it's invalidated after changes of parselets in grammar. Optimizer with
+    disabled optimizations returns declared parselets, e.g. it's used by parser for profiling of grammar.
+    """
+
+    def __init__(self, grammar: Grammar, *, is_optimized: bool = None):
+        self.__grammar = grammar
+        self.__is_optimized = grammar.is_optimized if is_optimized is None else is_optimized
+        self.__inlines = find_inlines(grammar) if self.__is_optimized else {}
+
+    @property
+    def grammar(self) -> Grammar:
+        return self.__grammar
+
+    @property
+    def is_optimized(self) -> bool:
+        """ Returns true, if parselets are optimized """
+        return self.__is_optimized
+
+    @property
+    def inlines(self) -> Mapping[ParseletID, Combinator]:
+        """ Returns combinators of trivial parselets, that are inlined to callers """
+        return self.__inlines
+
+    def optimize_combinator(self, combinator: Combinator) -> Combinator:
+        """ Returns combinator with inlined trivial parselets """
+        if isinstance(combinator, ParseletCombinator) and combinator.parser_id in self.__inlines:
+            return self.__inlines[combinator.parser_id]
+        return combinator.transform(self.optimize_combinator)
+
+    def optimize_parselets(self, parselets: Sequence[Parselet]) -> Sequence[Parselet]:
+        """ Returns parselets with inlined trivial parselets """
+        if not self.__inlines:
+            return parselets
+
+        result = []
+        for parselet in parselets:
+            combinator = self.optimize_combinator(parselet.combinator)
+            if combinator is not parselet.combinator:
+                parselet = attr.evolve(parselet, combinator=self.__grammar.intern_combinator(combinator))
+            result.append(parselet)
+        return result
+
+    def factor_parselets(self, parselets: Sequence[Parselet]) -> Sequence[Parselet]:
+        """ Returns left factored parselets """
+        return factor_parselets(parselets) if self.__is_optimized else parselets
+
+
+def find_inlines(grammar: Grammar) -> Mapping[ParseletID, Combinator]:
+    """
+    Find trivial parselets, e.g. Packrat parselets with single alternative that returns result of token or another
+    parselet without variables.
+    """
+    combinators: MutableMapping[ParseletID, Combinator] = {}
+    for parser_id, table in grammar.tables.items():
+        if not isinstance(table, PackratTable) or len(table.parselets) != 1:
+            continue
+        parselet = table.parselets[0]
+        combinator = parselet.combinator
+        if not isinstance(parselet.action, ReturnResultAction):
+            continue
+        if not isinstance(combinator, (TokenCombinator, ParseletCombinator)):
+            continue
+        if combinator.result_type != parser_id.result_type:
+            continue
+        combinators[parser_id] = combinator
+
+    # resolve chains of trivial parselets, e.g. `a := b` and `b := Name`. Recursive chains are not inlined
+    inlines = {}
+    for parser_id, combinator in combinators.items():
+        visited = {parser_id}
+        while isinstance(combinator, ParseletCombinator) and combinator.parser_id in combinators:
+            if combinator.parser_id in visited:
+                break
+            visited.add(combinator.parser_id)
+            combinator = combinators[combinator.parser_id]
+        else:
+            inlines[parser_id] = combinator
+    return inlines
+
+
+@attr.dataclass(frozen=True, order=False, eq=False)
+class FactoredParselet(Parselet):
+    """
+    Parselet for alternatives with common prefix, e.g. left factored alternatives:
+
+        expr := name:Name '=' value:expr
+        expr := name:Name '(' args:expr ')'
+
+    is rewritten to:
+
+        expr := name:Name ( '=' value:expr | '(' args:expr ')' )
+
+    Common prefix is parsed only once and after that alternatives try rest of combinators in order. Result of
+    alternative is created by action of original parselet.
+    """
+    alternatives: Sequence[Tuple[Optional[Combinator], Parselet]] = ()
+
+    def __call__(self, parser: Parser) -> ParseletResult:
+        context = self.alternatives[0][1]
+        prefix_result, namespace, error = self.combinator(parser, context)
+        namespace = freeze_namespace(namespace)
+
+        for combinator, parselet in self.alternatives:
+            # alternative is matched with common prefix
+            if combinator is None:
+                return parselet.action(prefix_result, parselet.merge_namespace(namespace)), error
+
+            try:
+                with parser.backtrack():
+                    result, last_namespace, last_error = combinator(parser, parselet)
+            except ParserError as last_error:
+                error = ParserError.merge(error, last_error)
+            else:
+                # namespace of prefix is shared between alternatives
+                alternative_namespace = dict(namespace)
+                accumulate_namespace(alternative_namespace, last_namespace)
+                result = parselet.action(result, parselet.merge_namespace(alternative_namespace))
+                return result, ParserError.merge(error, last_error)
+
+        raise error
+
+
+def get_elements(combinator: Combinator) -> Sequence[Combinator]:
+    """ Returns elements of sequence combinator or combinator as single element """
+    return combinator.combinators if isinstance(combinator, SequenceCombinator) else (combinator,)
+
+
+def get_common_prefix(lhs: Sequence[Combinator], rhs: Sequence[Combinator]) -> Sequence[Combinator]:
+    """ Returns common prefix of two sequences of combinators. Prefix is ended before first cut combinator """
+    prefix = []
+    for lhs_element, rhs_element in zip(lhs, rhs):
+        if lhs_element != rhs_element or isinstance(lhs_element, CutCombinator):
+            break
+        prefix.append(lhs_element)
+    return prefix
+
+
+def is_factorable(prefix: Sequence[Combinator], parselets: Sequence[Parselet]) -> bool:
+    """
+    Returns true, if common prefix can be parsed only once for all parselets, e.g. variables of prefix has same kind
+    in all parselets.
+    """
+    if not prefix:
+        return False
+
+    variables = make_sequence(*prefix).variables
+    for name in variables:
+        kinds = {is_sequence_type(parselet.variables[name]) for parselet in parselets}
+        if len(kinds) > 1:
+            return False
+    return True
+
+
+def factor_parselets(parselets: Sequence[Parselet]) -> Sequence[Parselet]:
+    """
+    Left factoring of alternatives, e.g. neighbour alternatives with common prefix are replaced with factored
+    parselet. Order of alternatives is preserved.
+    """
+    result = []
+    index = 0
+    while index < len(parselets):
+        group: List[Parselet] = [parselets[index]]
+        prefix = get_elements(parselets[index].combinator)
+
+        # collect neighbour alternatives with common prefix
+        for parselet in parselets[index + 1:]:
+            next_prefix = get_common_prefix(prefix, get_elements(parselet.combinator))
+            if not is_factorable(next_prefix, group + [parselet]):
+                break
+            group.append(parselet)
+            prefix = next_prefix
+
+        index += len(group)
+        if len(group) == 1:
+            result.append(group[0])
+            continue
+
+        alternatives = []
+        for parselet in group:
+            elements = get_elements(parselet.combinator)[len(prefix):]
+            alternatives.append((make_sequence(*elements) if elements else None, parselet))
+
+        first = group[0]
+        result.append(FactoredParselet(
+            first.parser_id, make_sequence(*prefix), first.action, first.priority, first.location, tuple(alternatives)
+        ))
+    return result
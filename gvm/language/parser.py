@@ -4,44 +4,208 @@
 # of the MIT license. See the LICENSE file for details.
 from __future__ import annotations
 
+import collections
+import enum
 from contextlib import contextmanager
 from io import StringIO
-from typing import Set, Optional, TYPE_CHECKING, MutableMapping, Tuple, Sequence
+from typing import Set, Optional, TYPE_CHECKING, MutableMapping, Tuple, Sequence, List, Hashable, Callable, \
+    TypeVar
 
 import attr
 
 from gvm.exceptions import GVMError, dump_source_string
-from gvm.language.syntax import SyntaxToken
+from gvm.language.syntax import SyntaxToken, ErrorNode
 from gvm.locations import Location
 from gvm.writers import Writer, create_writer
 
 if TYPE_CHECKING:
-    from gvm.language.scanner import Scanner
+    from gvm.language.scanner import Scanner, ExpectedTokens
     from gvm.language.grammar import TokenID, ParseletID, ParseletResult, Parselet
 
+# Memorized result of parselet or combinator: result, position after it and errors collected in recovery mode
+ParserMemo = Tuple[object, int, Tuple['ParserError', ...]]
+
+T = TypeVar('T')
+
+
+class MemoizationMode(enum.IntEnum):
+    """ Memoization mode of parselet """
+    Off = enum.auto()  # results of parselet are not memorized
+    On = enum.auto()  # results of parselet are memorized at each position
+    Auto = enum.auto()  # results of parselet are memorized if it's required by profile, e.g. by hit rate in memo
+
+
+@attr.dataclass
+class ParseletProfile:
+    """ Profile of parselet """
+    calls: int = 0  # count of calls of parselet
+    lookups: int = 0  # count of lookups in memo
+    hits: int = 0  # count of hits in memo
+    is_memoized: bool = True  # results of parselet in `MemoizationMode.Auto` mode are memorized
+    window_lookups: int = 0  # count of lookups in memo after the last decision of memoization
+    window_hits: int = 0  # count of hits in memo after the last decision of memoization
+    skipped_calls: int = 0  # count of calls without memoization after the last decision of memoization
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+
+@attr.dataclass
+class ParserProfile:
+    """
+    Profile of parser, e.g. count of calls and memo hits for each parselet.
+
+    Profile can be shared between parsers, e.g. collected on sample inputs and used for decide memoization of parselets
+    in `MemoizationMode.Auto` mode. Memoization is decided by hit rate of each `min_lookups` lookups in memo, and
+    parselet with low hit rate is memorized again after `max_skipped_calls` calls for sampling of hit rate, e.g.
+    decision is revisited during parsing.
+    """
+    min_lookups: int = 100  # memoization of parselet is decided after each this count of lookups in memo
+    min_hit_rate: float = 0.1  # results of parselet are memorized if hit rate in memo is not less that it
+    max_skipped_calls: int = 1000  # results of parselet are not memorized for this count of calls after decision
+    parselets: MutableMapping[ParseletID, ParseletProfile] = attr.ib(
+        factory=lambda: collections.defaultdict(ParseletProfile))
+    # count of wins for alternatives, e.g. how often parselet is successfully matched in choice
+    wins: MutableMapping[Parselet, int] = attr.ib(factory=lambda: collections.defaultdict(int))
+
+    def is_memoized(self, parser_id: ParseletID) -> bool:
+        """ Returns true, if results of parselet in `MemoizationMode.Auto` mode must be memorized """
+        return self.parselets[parser_id].is_memoized
+
+    def add_call(self, parser_id: ParseletID, is_memoized: bool):
+        """ Register call of parselet in `MemoizationMode.Auto` mode, e.g. memoization is sampled again after skips """
+        profile = self.parselets[parser_id]
+        if not is_memoized:
+            profile.skipped_calls += 1
+            if profile.skipped_calls >= self.max_skipped_calls:
+                profile.is_memoized = True
+                profile.skipped_calls = 0
+
+    def add_lookup(self, parser_id: ParseletID, is_hit: bool):
+        """ Register lookup of parselet in memo, e.g. memoization is decided after each `min_lookups` lookups """
+        profile = self.parselets[parser_id]
+        profile.lookups += 1
+        profile.hits += is_hit
+        profile.window_lookups += 1
+        profile.window_hits += is_hit
+        if profile.window_lookups >= self.min_lookups:
+            profile.is_memoized = profile.window_hits >= profile.window_lookups * self.min_hit_rate
+            profile.window_lookups = profile.window_hits = 0
+
 
 class Parser:
     """
     This parser is used for parse using Pratt and Packrat algorithm.
     """
 
-    def __init__(self, scanner: Scanner):
+    def __init__(self, scanner: Scanner, *, tokens: Sequence[SyntaxToken] = None, recovery: bool = False,
+                 profile: ParserProfile = None, contextual: bool = False, optimized: bool = True):
+        """
+        :param scanner:     Scanner for input stream
+        :param tokens:      Already tokenized input stream, e.g. result of `Scanner.tokenize_all`. If it's passed
+                            then parser doesn't pull tokens from scanner
+        :param recovery:    Enable recovery mode, e.g. parser collects errors and continue parsing after them
+        :param profile:     Profile of parser. If it's passed then parser collects calls and memo hits of parselets
+                            in it, and memoization of parselets in `MemoizationMode.Auto` mode is decided by it
+        :param contextual:  Enable contextual lexing, e.g. parser asks scanner for next token restricted to tokens
+                            that are expected in current state. In this mode position of parser is offset in input
+                            stream
+        :param optimized:   Use optimized parselets of grammar. If it's false, then parser tries declared alternatives
+                            of parselets without changes of grammar, e.g. for profiling of grammar
+        """
         self.grammar = scanner.grammar
+        from gvm.language.optimizer import GrammarOptimizer
+        self.optimizer = self.grammar.optimizer if optimized else GrammarOptimizer(self.grammar, is_optimized=False)
         self.scanner = scanner
-        self.__tokenizer = iter(self.scanner)
-        self.__tokens = []
+        self.__eof_index = scanner.eof_id.id
+        if contextual:
+            if tokens is not None:
+                raise ValueError("Buffer of tokens can not be used for contextual lexing")
+            if not scanner.is_contextual:
+                raise ValueError(f"Scanner {type(scanner).__name__} can not be used for contextual lexing")
+            self.__tokenizer = None
+            self.__tokens = []
+        elif tokens is None:
+            self.__tokenizer = iter(self.scanner)
+            self.__tokens = []
+        else:
+            if not tokens or tokens[-1].id != scanner.eof_id:
+                raise ValueError("Buffer of tokens must be ended with EOF token")
+            self.__tokenizer = None
+            self.__tokens = list(tokens)
+        # tokens lexed in contextual mode: offset in input stream -> expected tokens -> token
+        self.__contextual: Optional[MutableMapping[int, MutableMapping[ExpectedTokens, SyntaxToken]]] = \
+            {} if contextual else None
         self.__position = 0
-        self.__memory: MutableMapping[Tuple[int, ParseletID], ParseletResult] = {}
+        self.__offset = 0  # tokens and memorized results before this position are released
+        # states of backtrack frames: position and count of errors, cut frames are replaced with None
+        self.__frames: List[Optional[Tuple[int, int]]] = []
+        self.__memory: MutableMapping[int, MutableMapping[Hashable, ParserMemo]] = {}
+        self.__profile = profile
+        self.__recovery = recovery
+        self.__errors: List[ParserError] = []
+
+    @property
+    def recovery(self) -> bool:
+        """ Returns true, if parser is collected errors and continue parsing after them """
+        return self.__recovery
+
+    @property
+    def errors(self) -> Sequence[ParserError]:
+        """ Returns errors collected by parser in recovery mode """
+        return self.__errors
+
+    @property
+    def profile(self) -> Optional[ParserProfile]:
+        return self.__profile
+
+    @property
+    def contextual(self) -> bool:
+        """ Returns true, if parser is used contextual lexing """
+        return self.__contextual is not None
+
+    @property
+    def position(self) -> int:
+        """ Returns position of parser: index of current token or it's offset for contextual lexing """
+        return self.__position
 
     @property
     def current_token(self) -> SyntaxToken:
+        if self.__contextual is not None:
+            return self.peek()
         return self.__tokens[self.__position]
 
+    def peek(self, expected: ExpectedTokens = None) -> SyntaxToken:
+        """
+        Returns current token.
+
+        In contextual mode current token is lexed only by patterns of expected tokens, e.g. tokens that are expected in
+        current state of parser. If none of them is matched, then current token is lexed by all patterns.
+
+        :param expected:    Expected token or frozen set of tokens, None for all tokens
+        """
+        if self.__contextual is None:
+            return self.__tokens[self.__position]
+
+        tokens = self.__contextual.get(self.__position)
+        if tokens is None:
+            tokens = self.__contextual[self.__position] = {}
+        token = tokens.get(expected)
+        if token is None:
+            token = tokens[expected] = self.scanner.scan_token(self.__position, expected)
+        return token
+
     def advance(self) -> SyntaxToken:
+        if self.__contextual is not None:
+            token = self.peek()
+            self.__position = token.end
+            return token
+
         token = self.__tokens[self.__position]
-        if token.id != self.scanner.eof_id:
+        if token.id.id != self.__eof_index:
             self.__position += 1
-            while self.__position >= len(self.__tokens):
+            if self.__position == len(self.__tokens):
                 self.__tokens.append(next(self.__tokenizer))
         return token
 
@@ -57,7 +221,9 @@ class Parser:
         :param index:     Token identifier
         :return: True, if current token is matched passed identifiers
         """
-        return self.current_token.id == index
+        if self.__contextual is not None:
+            return self.peek(index).id.id == index.id
+        return self.__tokens[self.__position].id.id == index.id
 
     def consume(self, index: TokenID) -> SyntaxToken:
         """
@@ -67,36 +233,162 @@ class Parser:
         :return: Return consumed token
         :raise Diagnostic if current token is not matched passed identifiers
         """
-        if self.current_token.id == index:
+        if self.__contextual is not None:
+            token = self.peek(index)
+            if token.id.id == index.id:
+                self.__position = token.end
+                return token
+        elif self.__tokens[self.__position].id.id == index.id:
             return self.advance()
         raise self.error({index})
 
     @contextmanager
     def backtrack(self):
-        position = self.__position
+        """
+        Open backtrack frame, e.g. on error the state of parser is restored to state before frame.
+
+        If frame is cut then state of parser is not restored and error is wrapped to `ParserCutError`, e.g. enclosing
+        choice must not try next alternatives.
+        """
+        frame = len(self.__frames)
+        self.__frames.append((self.__position, len(self.__errors)))
         try:
             yield
         except ParserError as ex:
-            self.__position = position
+            state = self.__frames[frame]
+            if state is None:
+                raise ParserCutError(ex)
+            self.__position, count = state
+            del self.__errors[count:]
             raise ex
+        finally:
+            del self.__frames[frame:]
+
+    def update_frame(self):
+        """
+        Move current backtrack frame to current state of parser, e.g. on error the state of parser is restored to it.
+
+        It's used by loops in single frame: frame is moved after each matched element. Cut of frame is also reset,
+        because the cut element is already matched and tokens before current position are committed.
+        """
+        self.__frames[-1] = (self.__position, len(self.__errors))
+
+    def cut(self):
+        """
+        Cut current backtrack frame, e.g. commit current alternative.
+
+        Parser can't backtrack before position of first not cut frame, therefore tokens and memorized results before
+        it are released.
+        """
+        if self.__frames:
+            self.__frames[-1] = None
+        position = min((state[0] for state in self.__frames if state is not None), default=self.__position)
+        for index in range(self.__offset, position):
+            if self.__contextual is not None:
+                self.__contextual.pop(index, None)
+            else:
+                self.__tokens[index] = None
+            self.__memory.pop(index, None)
+        self.__offset = max(self.__offset, position)
+
+    def synchronize(self) -> Sequence[SyntaxToken]:
+        """
+        Skip tokens to next synchronization token (inclusive) or to unpaired close bracket (exclusive).
+
+        Nested brackets are skipped as whole, e.g. synchronization tokens in brackets are ignored.
+
+        :return: Skipped tokens
+        """
+        bracket_pairs = self.grammar.bracket_pairs
+        close_brackets = self.grammar.close_brackets
+        synchronization = self.grammar.synchronization
+        brackets = []  # expected close brackets
+        tokens = []
+
+        while self.current_token.id != self.scanner.eof_id:
+            token_id = self.current_token.id
+            if token_id in bracket_pairs:
+                brackets.append(bracket_pairs[token_id])
+            elif token_id in brackets:
+                while brackets.pop() != token_id:
+                    pass
+            elif tokens and not brackets and token_id in close_brackets:
+                break
+
+            tokens.append(self.advance())
+            if not brackets and token_id in synchronization:
+                break
+        return tokens
+
+    def recover(self, error: ParserError, tokens: Optional[Sequence[SyntaxToken]] = None) -> ErrorNode:
+        """
+        Register error and skip tokens to next synchronization point
+
+        :param error:   Parser error
+        :param tokens:  Tokens that are already skipped by `synchronize`, e.g. tokens are not skipped again
+        :return: Error node, that contains error and skipped tokens
+        """
+        self.__errors.append(error)
+        return ErrorNode(error, self.synchronize() if tokens is None else tokens)
 
     def parselet(self, parser_id: ParseletID, priority: int = None) -> ParseletResult:
         """
         Use parselet to consume next tokens and create syntax node.
 
-        This call is cached for given parselet and current position, e.g. using packrat parsing
+        This call is cached for given parselet and current position, e.g. using packrat parsing. Caching is
+        configured by memoization mode of parselet.
 
         :param parser_id:   Parselet identifier
         :param priority:    Initial priority, by default is `PRIORITY_MIN`
         :return:
         """
         priority = priority or 0
-        key = (self.__position, parser_id)
-        result = self.__memory.get(key, None)
-        if not result:
-            table = self.grammar.tables[parser_id]
-            result = table(self, priority)
-            self.__memory[key] = result
+        table = self.grammar.tables[parser_id]
+        memoization = table.memoization
+        profile = self.__profile
+        if profile is not None:
+            profile.parselets[parser_id].calls += 1
+        if memoization is MemoizationMode.Auto:
+            is_memoized = profile is None or profile.is_memoized(parser_id)
+            if profile is not None:
+                profile.add_call(parser_id, is_memoized)
+            memoization = MemoizationMode.On if is_memoized else MemoizationMode.Off
+        if memoization is MemoizationMode.Off:
+            return table(self, priority)
+
+        key = (parser_id.id, priority)
+        if profile is not None:
+            memory = self.__memory.get(self.__position)
+            profile.add_lookup(parser_id, memory is not None and key in memory)
+        return self.memoize(key, table, self, priority)
+
+    def memoize(self, key: Hashable, functor: Callable[..., T], *args) -> T:
+        """
+        Call functor and memorize it's result for current position.
+
+        Next call with same key at same position returns memorized result and restores position after it, e.g.
+        functor must consume tokens only by this parser.
+
+        :param key:         Key of memorized result, e.g. tuple of integer identifier of parselet and priority for
+                            parselets
+        :param functor:     Functor
+        :param args:        Arguments for functor
+        :return: Result of functor
+        """
+        position = self.__position
+        memory = self.__memory.get(position)
+        memo = memory.get(key) if memory is not None else None
+        if memo is None:
+            count = len(self.__errors)
+            result = functor(*args)
+            if position >= self.__offset:
+                if memory is None:
+                    memory = self.__memory[position] = {}
+                memory[key] = result, self.__position, tuple(self.__errors[count:])
+            return result
+
+        result, self.__position, errors = memo
+        self.__errors.extend(errors)
         return result
 
     def choice(self, parselets: Sequence[Parselet], *args) -> ParseletResult:
@@ -105,25 +397,51 @@ class Parser:
             try:
                 with self.backtrack():
                     result, last_error = parselet(self, *args)
-                    return result, ParserError.merge(error, last_error)
             except ParserError as last_error:
                 error = ParserError.merge(error, last_error)
+            except ParserCutError as ex:
+                raise ParserError.merge(error, ex.error)
+            else:
+                if self.__profile is not None:
+                    self.__profile.wins[parselet] += 1
+                return result, ParserError.merge(error, last_error)
 
         raise error or ParserConsumeNothingError()
 
     def parse(self, parser_id: ParseletID):
-        """ Parse all tokens from input stream or fail. """
+        """
+        Parse all tokens from input stream or fail.
+
+        In recovery mode parser doesn't fail on errors, instead of it parser collects errors in `errors` and
+        skips tokens to next synchronization point. If start parselet is not consumed all tokens, then rest of tokens
+        are parsed by start parselet again only for collecting errors from them, e.g. results of these parses are
+        dropped and returned result is covered only tokens before the first unexpected token.
+        """
         # first token from scanner
-        self.__tokens.append(next(self.__tokenizer))
+        if self.__contextual is None and not self.__tokens:
+            self.__tokens.append(next(self.__tokenizer))
 
         # parse start parselet
-        result, error = self.parselet(parser_id)
-
-        # required EOF
         try:
-            self.consume(self.scanner.eof_id)
+            result, error = self.parselet(parser_id)
         except ParserError as ex:
-            raise ParserError.merge(error, ex)
+            if not self.__recovery:
+                raise ex
+            result, error = self.recover(ex), None
+
+        # required EOF
+        while self.current_token.id != self.scanner.eof_id:
+            ex = ParserError.merge(error, self.error({self.scanner.eof_id}))
+            if not self.__recovery:
+                raise ex
+
+            # skip tokens and parse start parselet again for collect errors from rest of tokens, it's result is dropped
+            self.recover(ex)
+            try:
+                _, error = self.parselet(parser_id)
+            except ParserError as ex:
+                error = ex
+
         return result
 
 
@@ -180,3 +498,17 @@ class ParserError(SyntaxError):
 
 class ParserConsumeNothingError(SyntaxError):
     pass
+
+
+class ParserCutError(GVMError):
+    """
+    This exception is raised from cut backtrack frame, e.g. alternative is committed and enclosing choice must not try
+    next alternatives.
+
+    It's not subclass of `ParserError` and it's unwrapped by enclosing choice, optional and repeat combinators.
+    """
+
+    def __init__(self, error: ParserError):
+        super().__init__(error)
+
+        self.error = error
@@ -4,15 +4,17 @@
 # of the MIT license. See the LICENSE file for details.
 import functools
 from io import StringIO
-from typing import TypeVar, Callable, TextIO, Union, Type
+from typing import TypeVar, Callable, TextIO, Union, Type, Sequence
 
 from multimethod import multimethod
 from typing_inspect import is_generic_type, is_optional_type, get_args, get_origin
 
 from gvm.language import Grammar, TokenID, ParseletID
 from gvm.language.combinators import Combinator, TokenCombinator, ParseletCombinator, SequenceCombinator, \
-    NamedCombinator, OptionalCombinator, RepeatCombinator
+    NamedCombinator, OptionalCombinator, RepeatCombinator, SeparatedCombinator, ChoiceCombinator, \
+    CutCombinator, MemoCombinator
 from gvm.language.grammar import SyntaxPattern, Parselet
+from gvm.language.lint import LintWarning
 from gvm.typing import unpack_type_argument, is_sequence_type
 from gvm.writers import Color, Writer, create_writer
 
@@ -62,6 +64,27 @@ def dump_grammar(stream: Writer, grammar: Grammar):
             stream.write("\n")
 
 
+@dumper
+def dump_lint_warning(stream: Writer, warning: LintWarning):
+    stream.write(str(warning.location), ': ')
+    stream.write('warning', color=Color.Yellow)
+    stream.write(f'[{warning.kind.value}]: {warning.message}\n')
+    for parselet in warning.parselets:
+        stream.write('    ')
+        dump_parselet(stream, parselet)
+        stream.write('\n')
+    for pattern in warning.patterns:
+        stream.write('    ')
+        dump_pattern(stream, pattern)
+        stream.write('\n')
+
+
+@dumper
+def dump_lint_report(stream: Writer, warnings: Sequence[LintWarning]):
+    for warning in warnings:
+        dump_lint_warning(stream, warning)
+
+
 @dumper
 def dump_token_id(stream: Writer, token_id: TokenID):
     stream.write(repr(token_id.name) if token_id.is_implicit else token_id.name, color=Color.Red)
@@ -128,6 +151,15 @@ def dump_combinator(stream: Writer, combinator: RepeatCombinator):
     stream.write(' }')
 
 
+@dump_combinator.register
+def dump_combinator(stream: Writer, combinator: SeparatedCombinator):
+    stream.write('{ ')
+    dump_combinator(stream, combinator.combinator)
+    stream.write(' % ')
+    dump_combinator(stream, combinator.separator)
+    stream.write(' % }' if combinator.is_trailing else ' }')
+
+
 @dump_combinator.register
 def dump_combinator(stream: Writer, combinator: SequenceCombinator):
     for idx, child in enumerate(combinator.combinators):
@@ -136,6 +168,32 @@ def dump_combinator(stream: Writer, combinator: SequenceCombinator):
         dump_combinator(stream, child)
 
 
+@dump_combinator.register
+def dump_combinator(stream: Writer, combinator: MemoCombinator):
+    stream.write('@')
+    if isinstance(combinator.combinator, SequenceCombinator):
+        stream.write('( ')
+        dump_combinator(stream, combinator.combinator)
+        stream.write(' )')
+    else:
+        dump_combinator(stream, combinator.combinator)
+
+
+@dump_combinator.register
+def dump_combinator(stream: Writer, combinator: CutCombinator):
+    stream.write('~')
+
+
+@dump_combinator.register
+def dump_combinator(stream: Writer, combinator: ChoiceCombinator):
+    stream.write('( ')
+    for idx, child in enumerate(combinator.combinators):
+        if idx:
+            stream.write(' | ')
+        dump_combinator(stream, child)
+    stream.write(' )')
+
+
 @dumper
 def dump_type(stream: Writer, typ: Type):
     if is_optional_type(typ):
@@ -0,0 +1,55 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+from __future__ import annotations
+
+import itertools
+from typing import Iterable, Tuple, Type, Mapping, Sequence, MutableMapping
+
+from gvm.language.grammar import Grammar, ParseletID, PackratTable
+from gvm.language.parser import Parser, ParserProfile
+from gvm.language.scanner import Scanner, DefaultScanner
+
+
+def profile_grammar(grammar: Grammar, parser_id: ParseletID, sources: Iterable[Tuple[str, str]], *,
+                    scanner_class: Type[Scanner] = DefaultScanner, profile: ParserProfile = None) -> ParserProfile:
+    """
+    Parse corpus of sources with instrumented parser and returns profile of parser, e.g. how often each parselet
+    is called and how often each alternative is won.
+
+    Sources is pairs of filename and content. Optimizations of parselets are disabled in parser, because wins must be
+    collected for declared alternatives of parselets, not for inlined or left factored alternatives.
+    """
+    profile = profile or ParserProfile()
+    for filename, content in sources:
+        parser = Parser(scanner_class(grammar, filename, content), recovery=True, profile=profile, optimized=False)
+        parser.parse(parser_id)
+    return profile
+
+
+def make_ordering(grammar: Grammar, profile: ParserProfile) -> Mapping[str, Sequence[int]]:
+    """
+    Returns ordering of alternatives for Packrat parselets, e.g. the most common alternatives are tried first.
+
+    Alternatives are reordered only among alternatives with same priority and only if it's provably safe, e.g.
+    alternatives are not nullable and their FIRST sets are disjoint. Returned ordering contains only parselets with
+    changed order of alternatives and can be loaded to grammar with `Grammar.reorder_parselets`.
+    """
+    ordering: MutableMapping[str, Sequence[int]] = {}
+    for parser_id, table in grammar.tables.items():
+        if not isinstance(table, PackratTable):
+            continue
+
+        indexes = []
+        positions = range(len(table.parselets))
+        for _, group in itertools.groupby(positions, key=lambda index: table.parselets[index].priority):
+            group = list(group)
+            if len(group) > 1 and grammar.analysis.is_disjoint([table.parselets[index] for index in group]):
+                # sort is stable: alternatives with same count of wins are preserved in declared order
+                group.sort(key=lambda index: profile.wins.get(table.parselets[index], 0), reverse=True)
+            indexes.extend(group)
+
+        if indexes != list(positions):
+            ordering[parser_id.name] = indexes
+    return ordering
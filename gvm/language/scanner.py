@@ -4,12 +4,349 @@
 # of the MIT license. See the LICENSE file for details.
 from __future__ import annotations
 
-import collections
-from typing import Iterator, Optional
+import bisect
+import concurrent.futures
+import copy
+import itertools
+import re
+from typing import Iterator, AbstractSet, Sequence, Pattern, Optional, Mapping, MutableMapping, Tuple, Iterable, \
+    Union, Callable, Match
 
-from gvm.language.grammar import Grammar, TokenID
+import attr
+
+from gvm.language.grammar import Grammar, TokenID, SyntaxPattern
 from gvm.language.syntax import SyntaxToken
-from gvm.locations import Location
+from gvm.locations import Location, Position
+from gvm.utils import cached_property
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# Expected tokens for contextual lexing: single token, set of tokens or None for all tokens
+ExpectedTokens = Union[TokenID, AbstractSet[TokenID], None]
+
+# Item of parsed regular expression: operator and it's arguments
+PatternItem = Tuple[object, object]
+
+CATEGORY_PATTERNS = {
+    sre_constants.CATEGORY_DIGIT: r'\d',
+    sre_constants.CATEGORY_NOT_DIGIT: r'\D',
+    sre_constants.CATEGORY_SPACE: r'\s',
+    sre_constants.CATEGORY_NOT_SPACE: r'\S',
+    sre_constants.CATEGORY_WORD: r'\w',
+    sre_constants.CATEGORY_NOT_WORD: r'\W',
+}
+
+ATOMIC_GROUP = getattr(sre_constants, 'ATOMIC_GROUP', None)
+REPEAT_OPERATORS = {
+    sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, 'POSSESSIVE_REPEAT', None)
+} - {None}
+
+
+class ScannerTable:
+    """
+    This class is contained compiled patterns of grammar, that used by scanners.
+
+    Table is cached in grammar and it's rebuilt after changes of patterns or trivia in grammar.
+    """
+
+    def __init__(self, grammar: Grammar):
+        # keywords are matched by patterns of identifier-like tokens, therefore their patterns are dropped from table
+        keyword_ids = {keyword_id for keywords in grammar.keywords.values() for keyword_id in keywords.values()}
+        patterns = [pattern for pattern in grammar.patterns if pattern.token_id not in keyword_ids]
+        if grammar.is_optimized:
+            # shadowed patterns never win longest match, therefore they're dropped from table
+            shadowed = find_shadowed_patterns(patterns)
+            patterns = [pattern for index, pattern in enumerate(patterns) if index not in shadowed]
+
+        # neighbour literal patterns, e.g. patterns of implicit tokens, are matched at once by single trie pattern.
+        # Token of trie pattern is None and it's resolved from matched string by `literals`.
+        self.patterns = []
+        self.literals = {}
+        groups = itertools.groupby(patterns, key=lambda pattern: get_pattern_literal(pattern.pattern) is not None)
+        for is_literal, group in groups:
+            group = list(group)
+            if is_literal and len(group) > 1:
+                for pattern in group:
+                    self.literals.setdefault(get_pattern_literal(pattern.pattern), pattern.token_id)
+                trie_pattern = make_trie_pattern(get_pattern_literal(pattern.pattern) for pattern in group)
+                self.patterns.append((re.compile(trie_pattern).match, None))
+            else:
+                self.patterns.extend((pattern.pattern.match, pattern.token_id) for pattern in group)
+        self.patterns = tuple(self.patterns)
+        self.trivia = frozenset(grammar.trivia)
+
+        # characters that can start token, e.g. used for skip of run of unmatched characters
+        start_pattern = make_start_pattern(pattern.pattern for pattern in patterns)
+        self.start_search = re.compile(start_pattern).search if start_pattern else None
+
+        # patterns of grammar for contextual lexing, e.g. patterns of keywords and shadowed patterns are not dropped
+        self.syntax_patterns = tuple(grammar.patterns)
+        self.contextual_patterns = {}
+
+        # lookup table indexed by integer identifier of token: keywords of identifier-like token or None
+        self.keywords = [None] * len(grammar.symbols)
+        for token_id, keywords in grammar.keywords.items():
+            self.keywords[token_id.id] = keywords
+
+        # lookup table indexed by integer identifier of token: +1 for open brackets, -1 for close brackets
+        self.bracket_flags = [0] * len(grammar.symbols)
+        for token_id in grammar.open_brackets:
+            self.bracket_flags[token_id.id] += 1
+        for token_id in grammar.close_brackets:
+            self.bracket_flags[token_id.id] -= 1
+
+    @cached_property
+    def ascii_patterns(self) -> Sequence[Sequence[Tuple[Callable[[str, int], Optional[Match[str]]], TokenID]]]:
+        """
+        Returns lookup table indexed by code of ASCII character: patterns, that can start non empty match from this
+        character. Patterns are compiled with ASCII flag, e.g. it's used by scanner for input that contains only ASCII
+        characters.
+        """
+        patterns = []
+        for match, token_id in self.patterns:
+            pattern = make_ascii_pattern(match.__self__)
+            start_pattern = make_start_pattern([pattern])
+            start_match = re.compile(start_pattern).match if start_pattern else None
+            patterns.append((pattern.match, token_id, start_match))
+
+        characters = [chr(code) for code in range(128)]
+        return tuple(
+            tuple((match, token_id) for match, token_id, start_match in patterns
+                  if not start_match or start_match(character))
+            for character in characters
+        )
+
+    def get_contextual_patterns(self, expected: ExpectedTokens, skipped: AbstractSet[TokenID]) \
+            -> Sequence[Tuple[Callable[[str, int], Optional[Match[str]]], TokenID]]:
+        """ Returns patterns of expected and skipped tokens in order of grammar. If expected is None returns all """
+        if expected is not None and not isinstance(expected, (TokenID, frozenset)):
+            expected = frozenset(expected)
+        key = expected, skipped
+        patterns = self.contextual_patterns.get(key)
+        if patterns is None:
+            patterns = self.syntax_patterns
+            if expected is not None:
+                expected = {expected} if isinstance(expected, TokenID) else expected
+                patterns = [
+                    pattern for pattern in patterns if pattern.token_id in expected or pattern.token_id in skipped
+                ]
+            patterns = tuple((pattern.pattern.match, pattern.token_id) for pattern in patterns)
+            self.contextual_patterns[key] = patterns
+        return patterns
+
+
+def make_start_pattern(patterns: Iterable[Pattern]) -> Optional[str]:
+    """
+    Returns regular expression for set of characters, that can start non empty match of any pattern, e.g.
+    `[0-9]+` and `[a-z_]\\w*` -> `[0-9a-z_]`. Set of characters is approximated, e.g. it can contain characters
+    that are not started any match. Returns None if any character can start match.
+    """
+    items = []
+    for pattern in patterns:
+        if pattern.flags & sre_constants.SRE_FLAG_IGNORECASE:
+            return None
+        first = get_pattern_first(sre_parse.parse(pattern.pattern, pattern.flags))
+        if first is None:
+            return None
+        items.extend(first)
+
+    # negated sets can't be merged with other items of set, therefore they are added as alternatives
+    negated = [item for item in items if item.startswith('[^')]
+    positive = ''.join(item for item in items if not item.startswith('[^'))
+    return '|'.join(([f'[{positive}]'] if positive else []) + sorted(set(negated))) or None
+
+
+def get_pattern_first(items: Sequence[PatternItem]) -> Optional[Sequence[str]]:
+    """
+    Returns items of character set, that can start non empty match of parsed regular expression, or None if any
+    character can start match. Negated sets are returned as complete sets, e.g. `[^a-z]`.
+    """
+    result = []
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            return result + [re.escape(chr(av))]
+        elif op is sre_constants.NOT_LITERAL:
+            return result + [f'[^{re.escape(chr(av))}]']
+        elif op is sre_constants.IN:
+            is_negated = av and av[0][0] is sre_constants.NEGATE
+            set_items = []
+            for item_op, item_av in av[1:] if is_negated else av:
+                if item_op is sre_constants.LITERAL:
+                    set_items.append(re.escape(chr(item_av)))
+                elif item_op is sre_constants.RANGE:
+                    set_items.append(f'{re.escape(chr(item_av[0]))}-{re.escape(chr(item_av[1]))}')
+                elif item_op is sre_constants.CATEGORY and item_av in CATEGORY_PATTERNS:
+                    set_items.append(CATEGORY_PATTERNS[item_av])
+                else:
+                    return None  # other items of set are approximated by any character
+            return result + ([f'[^{"".join(set_items)}]'] if is_negated else set_items)
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                first = get_pattern_first(branch)
+                if first is None:
+                    return None
+                result.extend(first)
+            if not any(is_pattern_nullable(branch) for branch in av[1]):
+                return result
+        elif op is sre_constants.SUBPATTERN or op is ATOMIC_GROUP or op in REPEAT_OPERATORS:
+            nested = av if op is ATOMIC_GROUP else av[-1]
+            first = get_pattern_first(nested)
+            if first is None:
+                return None
+            result.extend(first)
+            if not is_pattern_nullable([(op, av)]):
+                return result
+        elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            continue  # anchors and lookarounds are not consumed characters
+        else:
+            return None
+    return result
+
+
+def is_pattern_nullable(items: Sequence[PatternItem]) -> bool:
+    """ Returns true, if parsed regular expression can match empty string """
+    for op, av in items:
+        if op is sre_constants.BRANCH:
+            if not any(is_pattern_nullable(branch) for branch in av[1]):
+                return False
+        elif op is sre_constants.SUBPATTERN:
+            if not is_pattern_nullable(av[-1]):
+                return False
+        elif op is ATOMIC_GROUP:
+            if not is_pattern_nullable(av):
+                return False
+        elif op in REPEAT_OPERATORS:
+            if av[0] and not is_pattern_nullable(av[2]):
+                return False
+        elif op not in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT, sre_constants.GROUPREF):
+            return False
+    return True
+
+
+def make_trie_pattern(literals: Iterable[str]) -> str:
+    """
+    Returns regular expression, that is matched longest of literals, e.g. character trie of literals compiled to
+    regular expression:
+
+        '+', '+=', '++', '-'    ->  (?:\\+(?:=|\\+)?|\\-)
+    """
+    root = {}
+    for literal in literals:
+        node = root
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[''] = {}  # end of literal
+
+    def make_node_pattern(node: Mapping[str, dict]) -> str:
+        alternatives = [re.escape(char) + make_node_pattern(child) for char, child in node.items() if char]
+        if not alternatives:
+            return ''
+        pattern = alternatives[0] if len(alternatives) == 1 else f'(?:{"|".join(alternatives)})'
+        if '' not in node:
+            return pattern
+        # shorter literal is ended at this node, therefore rest of longer literals is optional
+        return f'{pattern}?' if len(alternatives) > 1 else f'(?:{pattern})?'
+
+    return make_node_pattern(root)
+
+
+def get_pattern_literal(pattern: Pattern) -> Optional[str]:
+    """ Returns string, if pattern is matched only this string, e.g. pattern of implicit token. Otherwise None """
+    if pattern.flags & sre_constants.SRE_FLAG_IGNORECASE:
+        return None
+    items = sre_parse.parse(pattern.pattern, pattern.flags)
+    if not all(op is sre_constants.LITERAL for op, _ in items):
+        return None
+    return ''.join(chr(code) for _, code in items) or None
+
+
+def is_ascii_compatible_pattern(pattern: Pattern) -> bool:
+    """
+    Returns true, if pattern compiled with ASCII flag is matched same strings from ASCII characters as original
+    pattern, e.g. pattern is ASCII string and it has not whitespace categories (Unicode whitespaces contains
+    ASCII characters `\x1c-\x1f`)
+    """
+    if not isinstance(pattern.pattern, str) or not pattern.pattern.isascii():
+        return False
+    categories = {sre_constants.CATEGORY_SPACE, sre_constants.CATEGORY_NOT_SPACE}
+    for op, av in iter_pattern_items(sre_parse.parse(pattern.pattern, pattern.flags)):
+        if op is sre_constants.IN and any(item_av in categories for _, item_av in av):
+            return False
+    return True
+
+
+def make_ascii_pattern(pattern: Pattern) -> Pattern:
+    """ Returns ASCII variant of pattern, if it's compatible with original pattern. Otherwise returns it as is """
+    if not is_ascii_compatible_pattern(pattern):
+        return pattern
+    return re.compile(pattern.pattern, pattern.flags & ~re.UNICODE | re.ASCII)
+
+
+def is_context_free_pattern(pattern: Pattern) -> bool:
+    """ Returns true, if result of pattern is not depended from context, e.g. pattern has not anchors or lookarounds """
+    operators = {sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT, sre_constants.GROUPREF}
+    items = sre_parse.parse(pattern.pattern, pattern.flags)
+    return not any(op in operators for op, _ in iter_pattern_items(items))
+
+
+def iter_pattern_items(items: Sequence[PatternItem]) -> Iterator[PatternItem]:
+    """ Returns items of parsed regular expression and all nested items in pre-order """
+    for op, av in items:
+        yield op, av
+        if op is sre_constants.BRANCH:
+            for branch in av[1]:
+                yield from iter_pattern_items(branch)
+        elif op is sre_constants.SUBPATTERN:
+            yield from iter_pattern_items(av[-1])
+        elif op in REPEAT_OPERATORS:
+            yield from iter_pattern_items(av[2])
+        elif op is ATOMIC_GROUP:
+            yield from iter_pattern_items(av)
+        elif op is sre_constants.ASSERT or op is sre_constants.ASSERT_NOT:
+            yield from iter_pattern_items(av[1])
+
+
+def find_shadowed_patterns(patterns: Sequence[SyntaxPattern]) -> Mapping[int, int]:
+    """
+    Find patterns that never win longest match in scanner, e.g. duplicates of previous patterns or literal patterns
+    that are fully matched by previous patterns (on same length previous pattern is won).
+
+    :return: Mapping from index of shadowed pattern to index of pattern that shadows it
+    """
+    shadowed: MutableMapping[int, int] = {}
+    context_free = [is_context_free_pattern(pattern.pattern) for pattern in patterns]
+    for index, pattern in enumerate(patterns):
+        literal = get_pattern_literal(pattern.pattern)
+        for other_index, other in enumerate(patterns[:index]):
+            if other.pattern == pattern.pattern:
+                shadowed[index] = other_index
+                break
+            if literal is not None and context_free[other_index]:
+                match = other.pattern.match(literal)
+                if match and match.end() == len(literal):
+                    shadowed[index] = other_index
+                    break
+    return shadowed
+
+
+@attr.dataclass(frozen=True)
+class ScannerCheckpoint:
+    """
+    This class is contained state of scanner after multi-line token, e.g. scanner can resume tokenization from it.
+    """
+
+    # Offset of checkpoint in input stream
+    offset: int
+
+    # Position of checkpoint
+    position: Position
+
+    # State of scanner, e.g. stack of indentations and depth of brackets for indentation scanner
+    state: object = None
 
 
 class Scanner:
@@ -17,62 +354,273 @@ class Scanner:
     This class is implemented tokenizer, that tokenize input stream to tokens.
 
     This tokenizer returns all tokens from source text, e.g. trivia, errors and e.t.c
+
+    Scanner records checkpoints every `checkpoint_interval` lines during tokenization, e.g. tokens of range in input
+    stream are tokenized from the nearest checkpoint before it.
     """
 
     eof_id: TokenID
     error_id: TokenID
+    checkpoint_interval: int = 256
+    is_contextual: bool = True  # scanner can lex single token at any offset, e.g. it has not state between tokens
 
     def __init__(self, grammar: Grammar, filename: str, content: str):
         self.grammar = grammar
+        self.filename = filename
         self.position = 0
+        self.line = 1
+        self.column = 1
         self.buffer = content
         self.length = len(self.buffer)
-        self.location = Location(filename)
         self.eof_id = grammar.tokens['<EOF>']
         self.error_id = grammar.tokens['<ERROR>']
+        self.checkpoints = [ScannerCheckpoint(0, Position(1, 1))]
+        self.checkpoint_offsets = [0]  # offsets of checkpoints, e.g. for binary search
+
+    @property
+    def location(self) -> Location:
+        """ Returns current location of scanner """
+        position = Position(self.line, self.column)
+        return Location(self.filename, position, position)
+
+    @cached_property
+    def line_offsets(self) -> Sequence[int]:
+        """ Returns offsets of beginnings of lines in input stream """
+        offsets = [0]
+        position = self.buffer.find('\n')
+        while position >= 0:
+            offsets.append(position + 1)
+            position = self.buffer.find('\n', position + 1)
+        return offsets
+
+    def get_position(self, offset: int) -> Position:
+        """ Returns position of character at given offset of input stream """
+        line = bisect.bisect_right(self.line_offsets, offset)
+        return Position(line, offset - self.line_offsets[line - 1] + 1)
 
     def tokenize(self) -> Iterator[SyntaxToken]:
-        while self.position < self.length:
-            token = self.__match()
-            if token:
-                yield token
+        return self.scan(frozenset())
+
+    def resume(self, checkpoint: ScannerCheckpoint) -> Iterator[SyntaxToken]:
+        """ Restore state of scanner from checkpoint and tokenize input stream from it """
+        self.restore(checkpoint)
+        return self.tokenize()
 
-        yield SyntaxToken(self.eof_id, "", self.location)
+    def restore(self, checkpoint: ScannerCheckpoint):
+        """ Move scanner to position of checkpoint """
+        self.position = checkpoint.offset
+        self.line = checkpoint.position.line
+        self.column = checkpoint.position.column
+
+    def get_checkpoint(self, offset: int) -> ScannerCheckpoint:
+        """ Returns the nearest recorded checkpoint before given offset of input stream """
+        index = bisect.bisect_right(self.checkpoint_offsets, offset)
+        return self.checkpoints[index - 1]
+
+    def add_checkpoint(self, state: object = None):
+        """ Record checkpoint at current position of scanner, if it's placed after last checkpoint on interval """
+        if self.line >= self.checkpoints[-1].position.line + self.checkpoint_interval:
+            self.checkpoints.append(ScannerCheckpoint(self.position, Position(self.line, self.column), state))
+            self.checkpoint_offsets.append(self.position)
+
+    def tokenize_range(self, begin: int, end: int) -> Iterator[SyntaxToken]:
+        """
+        Tokenize part of input stream from the nearest checkpoint. State of scanner is not changed, but new
+        checkpoints are recorded.
+
+        :param begin:   Offset of beginning of range in input stream
+        :param end:     Offset of end of range in input stream
+        :return:        Iterator over tokens that are overlapped with range, e.g. `token.end > begin` and
+                        `token.begin < end`. Empty tokens are included if they're placed in range
+        """
+        scanner = copy.copy(self)  # checkpoints are shared with copy of scanner
+        for token in scanner.resume(self.get_checkpoint(begin)):
+            if token.begin >= end:
+                break
+            if token.end > begin or token.begin >= begin:
+                yield token
 
-    def __match(self) -> Optional[SyntaxToken]:
-        self.location.columns(1)
-        self.location = self.location.step()
+    def scan_token(self, offset: int, expected: ExpectedTokens = None) -> SyntaxToken:
+        """
+        Tokenize single token at given offset of input stream, e.g. for contextual lexing. State of scanner is not
+        changed.
+
+        :param offset:      Offset of token in input stream
+        :param expected:    Expected tokens, e.g. only patterns of them are tried. If none of them is matched or
+                            other pattern is matched longer token, then all patterns are tried
+        :return:            Token, the token after end of input stream is EOF
+        """
+        return self.match_token(offset, expected, frozenset())
+
+    def match_token(self, offset: int, expected: ExpectedTokens, skipped: AbstractSet[TokenID]) -> SyntaxToken:
+        """ Match single token at given offset. Tokens with identifiers from `skipped` are consumed before it """
+        table = self.grammar.scanner_table
+        buffer = self.buffer
+        patterns = table.get_contextual_patterns(expected, skipped)
+        while offset < self.length:
+            token_id = None
+            max_position = offset
+            for match, pattern_id in patterns:
+                result = match(buffer, offset)
+                if result and result.end() > max_position:
+                    token_id, max_position = pattern_id, result.end()
+
+            if token_id is None:
+                if expected is not None:
+                    # expected tokens are not matched, e.g. parser reports error for actual token
+                    return self.match_token(offset, None, skipped)
+                token_id, max_position = self.error_id, self.skip_error(offset)
+            if token_id in skipped:
+                offset = max_position
+                continue
+            if expected is not None:
+                # longer token of input stream is not split by expected tokens, e.g. `--` is not lexed as `-`
+                token = self.match_token(offset, None, skipped)
+                if token.end > max_position:
+                    return token
+
+            location = Location(self.filename, self.get_position(offset), self.get_position(max_position - 1))
+            return SyntaxToken.from_buffer(token_id, buffer, offset, max_position, location)
+
+        position = self.get_position(self.length)
+        return SyntaxToken.from_buffer(self.eof_id, buffer, self.length, self.length,
+                                       Location(self.filename, position, position))
+
+    def tokenize_all(self) -> Sequence[SyntaxToken]:
+        """
+        Tokenize whole input stream at once and returns buffer of tokens, the last token is EOF.
+
+        Tokens are collected from `tokenize`, e.g. cost of scanning is same. Buffer is passed to parser, that doesn't
+        pull tokens from scanner during parsing.
+        """
+        return list(self.tokenize())
+
+    def scan(self, skipped: AbstractSet[TokenID], *, is_checkpointed: bool = True) -> Iterator[SyntaxToken]:
+        """
+        Tokenize input stream. Tokens with identifiers from `skipped` are consumed in inner loop, e.g.
+        without creation of syntax tokens and locations for them.
+
+        Input stream that contains only ASCII characters is tokenized by fast path: only patterns that can start
+        from current character are tried and these patterns are compiled with ASCII flag.
+
+        :param skipped:         Identifiers of skipped tokens
+        :param is_checkpointed: Record checkpoints after multi-line tokens. Scanners with own state are recorded
+                                checkpoints by themselves
+        :return:                Iterator over not skipped tokens, the last token is EOF
+        """
+        table = self.grammar.scanner_table
+        patterns = tuple((match, token_id, token_id in skipped) for match, token_id in table.patterns)
+        literals = table.literals
+        keywords = table.keywords
+        buffer = self.buffer
+        length = self.length
+        error_id = self.error_id
+        is_error_skipped = error_id in skipped
+
+        ascii_patterns = None
+        if buffer.isascii():
+            ascii_patterns = tuple(
+                tuple((match, token_id, token_id in skipped) for match, token_id in character_patterns)
+                for character_patterns in table.ascii_patterns
+            )
+
+        # offset of end of current line, e.g. tokens before it don't change line of scanner
+        line_end = buffer.find('\n', self.position)
+        line_end = length if line_end < 0 else line_end
+
+        while self.position < length:
+            position = self.position
+            token_id = error_id
+            is_skipped = is_error_skipped
+            max_position = position
+            if ascii_patterns:
+                patterns = ascii_patterns[ord(buffer[position])]
+            for match, pattern_id, is_pattern_skipped in patterns:
+                result = match(buffer, position)
+                if result and result.end() > max_position:
+                    token_id, is_skipped, max_position = pattern_id, is_pattern_skipped, result.end()
+            if max_position == position:
+                max_position = self.skip_error(position)
+            elif token_id is None:
+                # token of trie pattern is resolved from matched literal
+                token_id = literals[buffer[position:max_position]]
+                is_skipped = token_id in skipped
+            elif keywords[token_id.id]:
+                # identifier is reclassified to keyword
+                keyword_id = keywords[token_id.id].get(buffer[position:max_position])
+                if keyword_id:
+                    token_id, is_skipped = keyword_id, keyword_id in skipped
+
+            if max_position <= line_end:
+                # token is placed on single line, e.g. only column of scanner is changed
+                column = self.column
+                self.column += max_position - position
+                self.position = max_position
+                if not is_skipped:
+                    begin_position = Position(self.line, column)
+                    location = Location(self.filename, begin_position, Position(self.line, self.column - 1))
+                    yield SyntaxToken.from_buffer(token_id, buffer, position, max_position, location)
+                continue
 
-        # match patterns
-        results = ((pattern.token_id, pattern.match(self.buffer, self.position)) for pattern in self.grammar.patterns)
-        results = tuple((token_id, match) for token_id, match in results if match)
-        if results:
-            max_position = max(match.end() for _, match in results)
-            token_id, match = next((token_id, match) for token_id, match in results if match.end() == max_position)
-            position = match.end()
-            value = self.buffer[self.position:position]
+            if is_skipped:
+                self.skip(max_position)
+            else:
+                yield self.consume(token_id, max_position)
+            if is_checkpointed:
+                self.add_checkpoint()
+            line_end = buffer.find('\n', max_position)
+            line_end = length if line_end < 0 else line_end
+
+        yield SyntaxToken.from_buffer(self.eof_id, buffer, length, length, self.location)
+
+    def skip_error(self, position: int) -> int:
+        """
+        Returns end of run of characters, that are not matched by any pattern, e.g. error token. Candidates for
+        beginning of next token are found by set of characters, that can start any pattern.
+        """
+        table = self.grammar.scanner_table
+        start_search = table.start_search
+        buffer = self.buffer
+        position += 1
+        while position < self.length:
+            if start_search:
+                result = start_search(buffer, position)
+                if not result:
+                    return self.length
+                position = result.start()
+
+            for match, _ in table.patterns:
+                result = match(buffer, position)
+                if result and result.end() > position:
+                    return position
+            position += 1
+        return self.length
+
+    def consume(self, token_id: TokenID, position: int) -> SyntaxToken:
+        """ Create token from current position to given position and move scanner to end of it """
+        begin = self.position
+        begin_position = Position(self.line, self.column)
+
+        # location of token is ended at last character of it
+        self.skip(position - 1)
+        location = Location(self.filename, begin_position, Position(self.line, self.column))
+        if self.buffer[self.position] == '\n':
+            self.line += 1
+            self.column = 1
         else:
-            # match operators
-            value = self.buffer[self.position]
-            token_id = self.error_id
-            self.position += 1
-
-        self.position += len(value)
-        location = self.__consume_location(value)
-        return SyntaxToken(token_id, value, location)
-
-    def __consume_location(self, value):
-        for c in value[:-1]:
-            if c == '\n':
-                self.location = self.location.lines(1)
-            elif len(value) > 1:
-                self.location = self.location.columns(1)
-        location = self.location
-        if value[-1] == '\n':
-            self.location = self.location.lines(1)
+            self.column += 1
+        self.position = position
+        return SyntaxToken.from_buffer(token_id, self.buffer, begin, position, location)
+
+    def skip(self, position: int):
+        """ Move scanner to given position without creating token """
+        newlines = self.buffer.count('\n', self.position, position)
+        if newlines:
+            self.line += newlines
+            self.column = position - self.buffer.rfind('\n', self.position, position)
         else:
-            self.location = self.location.columns(1)
-        return location
+            self.column += position - self.position
+        self.position = position
 
     def __iter__(self):
         return self.tokenize()
@@ -82,17 +630,27 @@ class DefaultScanner(Scanner):
     """ This class is implemented tokenizer, that skipped trivia tokens from output tokens """
 
     def tokenize(self) -> Iterator[SyntaxToken]:
-        for token in super().tokenize():
-            if token.id not in self.grammar.trivia:
-                yield token
+        return self.scan(self.grammar.scanner_table.trivia)
+
+    def scan_token(self, offset: int, expected: ExpectedTokens = None) -> SyntaxToken:
+        return self.match_token(offset, expected, self.grammar.scanner_table.trivia)
 
 
 class IndentationScanner(Scanner):
     """
     This class is implemented tokenizer, that tracks indentations in source text (offset rule) and
     appended `indent` and `dedent` tokens to output tokens. Also skipped trivia tokens
+
+    Indentation of logical line is measured directly from beginning of line in source buffer, e.g. whitespaces are
+    skipped by scanner without creation of tokens for them. Blank lines, lines with only trivia tokens and lines
+    inside brackets are not changed indentation.
+
+    State of scanner in checkpoints is stack of indentations, depth of brackets and flag of new line. Contextual
+    lexing is not supported, because indentation tokens are depended on this state.
     """
 
+    is_contextual: bool = False
+
     def __init__(self, grammar: Grammar, filename: str, content: str):
         super().__init__(grammar, filename, content)
 
@@ -100,67 +658,229 @@ class IndentationScanner(Scanner):
         self.whitespace_id = grammar.add_token('Whitespace')
         self.indent_id = grammar.add_token('Indent')
         self.dedent_id = grammar.add_token('Dedend')
+        self.checkpoints = [ScannerCheckpoint(0, Position(1, 1), ((0,), 0, True))]
 
     def tokenize(self) -> Iterator[SyntaxToken]:
-        indentations = collections.deque([0])
-        is_new = True  # new line
-        whitespace = None
-        level = 0  # disable indentation
+        return self.__tokenize((0,), 0, True)
+
+    def resume(self, checkpoint: ScannerCheckpoint) -> Iterator[SyntaxToken]:
+        self.restore(checkpoint)
+        return self.__tokenize(*checkpoint.state)
+
+    def __tokenize(self, indentations: Tuple[int, ...], level: int, is_new: bool) -> Iterator[SyntaxToken]:
+        """
+        Tokenize input stream from current position of scanner.
+
+        :param indentations:    Stack of indentations, e.g. the last is indentation of current block
+        :param level:           Depth of brackets, e.g. indentation is disabled inside brackets
+        :param is_new:          Flag of new line, e.g. indentation of next token is checked
+        """
+        line_start = self.buffer.rfind('\n', 0, self.position) + 1  # offset of beginning of current line
+
+        # new lines are required for tracking indentation, but whitespaces are skipped
+        skipped = self.grammar.scanner_table.trivia - {self.newline_id} | {self.whitespace_id}
+        match_whitespace = next(
+            (pattern.pattern.match for pattern in self.grammar.patterns if pattern.token_id == self.whitespace_id), None
+        )
+        bracket_flags = self.grammar.scanner_table.bracket_flags
+        newline_index = self.newline_id.id
+        eof_index = self.eof_id.id
+        buffer = self.buffer
+        filename = self.filename
+        for token in self.scan(skipped, is_checkpointed=False):
+            index = token.id.id
 
-        for token in super().tokenize():
             # new line
-            if token.id == self.newline_id:
-                if level:
-                    continue
-
-                if not is_new:
-                    yield token
-
-                is_new = True
+            if index == newline_index:
+                line_start = token.end
+                if not level:
+                    if not is_new:
+                        yield token
+                    is_new = True
+
+                self.add_checkpoint((indentations, level, is_new))
                 continue
 
-            elif token.id == self.whitespace_id:
-                if is_new:
-                    whitespace = token
-                continue
-
-            elif token.id == self.eof_id:
-                location = Location(token.location.filename, token.location.end, token.location.end)
+            elif index == eof_index:
+                location = Location(filename, token.location.end, token.location.end)
 
                 if not is_new:
-                    yield SyntaxToken(self.newline_id, '', location)
+                    yield SyntaxToken.from_buffer(self.newline_id, buffer, token.begin, token.begin, location)
 
                 while indentations[-1] > 0:
-                    yield SyntaxToken(self.dedent_id, '', location)
-                    indentations.pop()
+                    yield SyntaxToken.from_buffer(self.dedent_id, buffer, token.begin, token.begin, location)
+                    indentations = indentations[:-1]
 
                 yield token
                 continue
 
-            elif token.id in self.grammar.trivia:
-                continue
-
             if is_new:
-                if whitespace:
-                    indent = len(whitespace.value)
-                    location = whitespace.location
-                    whitespace = None
+                result = match_whitespace(buffer, line_start) if match_whitespace else None
+                indent = result.end() - line_start if result else 0
+                begin = token.location.begin
+                if not indent:
+                    location = Location(filename, begin, begin)
+                elif result.end() == token.begin:
+                    # whitespaces are placed before token in same line
+                    location = Location(
+                        filename, Position(begin.line, begin.column - indent), Position(begin.line, begin.column - 1)
+                    )
                 else:
-                    indent = 0
-                    location = Location(token.location.filename, token.location.begin, token.location.begin)
+                    location = Location(filename, self.get_position(line_start), self.get_position(result.end() - 1))
 
                 if indentations[-1] < indent:
-                    yield SyntaxToken(self.indent_id, '', location)
-                    indentations.append(indent)
+                    yield SyntaxToken.from_buffer(self.indent_id, buffer, token.begin, token.begin, location)
+                    indentations += (indent,)
                 else:
                     while indentations[-1] > indent:
-                        yield SyntaxToken(self.indent_id, '', location)
-                        indentations.pop()
+                        yield SyntaxToken.from_buffer(self.dedent_id, buffer, token.begin, token.begin, location)
+                        indentations = indentations[:-1]
 
             is_new = False
-            if token.id in self.grammar.open_brackets:
-                level += 1
-            elif token.id in self.grammar.close_brackets:
-                level -= 1
+            level += bracket_flags[index]
 
             yield token
+
+
+class ParallelScanner(DefaultScanner):
+    """
+    This class is implemented tokenizer, that tokenize large input stream by chunks in pool of processes. Output
+    tokens are same as output tokens of `DefaultScanner`.
+
+    Input stream is split to chunks at beginnings of lines. Scanner of chunk is continued after end of chunk until
+    the first token after it, e.g. synchronization token. The next chunk is stitched from synchronization token, if
+    it's scanned the token at same offset: scanner has not state, therefore tokens after same token boundary are same.
+    Otherwise, e.g. synchronization token is not found in next chunk, the rest of input stream is tokenized
+    sequentially.
+    """
+
+    chunk_size: int = 1 << 20  # minimal count of characters in chunk
+    workers: Optional[int] = None  # count of processes in pool, default is count of processors
+
+    def tokenize(self) -> Iterator[SyntaxToken]:
+        offsets = self.get_chunk_offsets()
+        if len(offsets) < 2:
+            return super().tokenize()
+        return self.__tokenize_chunks(offsets)
+
+    def get_chunk_offsets(self) -> Sequence[int]:
+        """ Returns offsets of beginnings of chunks in input stream, e.g. current position and beginnings of lines """
+        offsets = [self.position]
+        while True:
+            offset = self.buffer.find('\n', offsets[-1] + self.chunk_size) + 1
+            if not offset or offset >= self.length:
+                return offsets
+            offsets.append(offset)
+
+    def __tokenize_chunks(self, offsets: Sequence[int]) -> Iterator[SyntaxToken]:
+        grammar = make_lexical_grammar(self.grammar)
+        token_ids = [self.grammar.tokens[name] for name in grammar.tokens]
+        ends = list(offsets[1:]) + [self.length + 1]  # EOF is included to the last chunk
+
+        # lines of beginnings of chunks are counted once in parent process, e.g. workers don't scan buffer before chunk
+        lines = [self.line]
+        for begin, end in zip(offsets, offsets[1:]):
+            lines.append(lines[-1] + self.buffer.count('\n', begin, end))
+
+        # the first chunk is started from current position of scanner, e.g. it can be placed in middle of line
+        columns = [self.column] + [1] * (len(offsets) - 1)
+        initargs = (grammar, self.filename, self.buffer)
+
+        with concurrent.futures.ProcessPoolExecutor(self.workers, initializer=init_chunk_worker, initargs=initargs) \
+                as executor:
+            futures = [executor.submit(tokenize_chunk, *args) for args in zip(offsets, ends, lines, columns)]
+            try:
+                synchronization = None
+                for future in futures:
+                    tokens, next_synchronization = future.result()
+                    index = 0
+                    if synchronization:
+                        # find synchronization token of previous chunk in current chunk
+                        begin = synchronization[1]
+                        while index < len(tokens) and tokens[index + 1] < begin:
+                            index += CHUNK_TOKEN_SIZE
+                        if index == len(tokens) or tokens[index + 1] != begin:
+                            break
+
+                    items = iter(tokens[index:])
+                    for token_index, begin, end, line, column, end_line, end_column in \
+                            zip(*[items] * CHUNK_TOKEN_SIZE):
+                        location = Location(self.filename, Position(line, column), Position(end_line, end_column))
+                        yield SyntaxToken.from_buffer(token_ids[token_index], self.buffer, begin, end, location)
+                    synchronization = next_synchronization
+                else:
+                    self.position = self.length
+                    self.line, self.column = end_line, end_column
+                    return
+            finally:
+                # pending chunks are not waited by shutdown of pool, e.g. after failed synchronization or if tokens
+                # are not consumed to end
+                for future in futures:
+                    future.cancel()
+
+        # synchronization is failed, e.g. token is continued over chunk
+        _, self.position, _, self.line, self.column, _, _ = synchronization
+        yield from super().tokenize()
+
+
+# Count of integers in flat representation of token: index of token, begin and end offsets, line and column of
+# begin and line and column of end
+CHUNK_TOKEN_SIZE = 7
+
+# Scanner for tokenization of chunks in worker process of parallel scanner
+chunk_scanner: Optional[Scanner] = None
+
+
+def make_lexical_grammar(grammar: Grammar) -> Grammar:
+    """
+    Returns grammar with tokens, patterns, trivia and keywords of grammar, e.g. it's used by scanner in other processes.
+    Tokens are added in same order, therefore their names are mapped to same tokens of original grammar.
+    """
+    lexical = Grammar()
+    lexical.is_optimized = grammar.is_optimized
+    for token_id in grammar.tokens.values():
+        lexical.add_token(token_id.name, token_id.description, location=token_id.location,
+                          is_implicit=token_id.is_implicit)
+    for pattern in grammar.patterns:
+        lexical.add_pattern(lexical.tokens[pattern.token_id.name], pattern.pattern.pattern,
+                            priority=pattern.priority, location=pattern.location, is_implicit=pattern.is_implicit)
+    for token_id in grammar.trivia:
+        lexical.add_trivia(lexical.tokens[token_id.name])
+    for token_id, keywords in grammar.keywords.items():
+        for keyword in keywords:
+            lexical.add_keyword(lexical.tokens[token_id.name], keyword, location=token_id.location)
+    return lexical
+
+
+def init_chunk_worker(grammar: Grammar, filename: str, content: str):
+    """ Initialize worker process of parallel scanner """
+    global chunk_scanner
+    chunk_scanner = DefaultScanner(grammar, filename, content)
+
+
+def tokenize_chunk(begin: int, end: int, line: int, column: int) -> Tuple[Sequence[int], Optional[Sequence[int]]]:
+    """
+    Tokenize chunk of input stream in worker process of parallel scanner.
+
+    :param begin:   Offset of beginning of chunk, e.g. beginning of line or position of scanner
+    :param end:     Offset of end of chunk
+    :param line:    Line of beginning of chunk
+    :param column:  Column of beginning of chunk
+
+    :return: Flat representation of tokens that are started in chunk and flat representation of synchronization
+             token, e.g. the first token after chunk. Synchronization token is None after EOF
+    """
+    scanner = copy.copy(chunk_scanner)
+    scanner.position = begin
+    scanner.line = line
+    scanner.column = column
+
+    tokens = []
+    for token in scanner.scan(scanner.grammar.scanner_table.trivia, is_checkpointed=False):
+        location = token.location
+        item = (token.id.id, token.begin, token.end, location.begin.line, location.begin.column,
+                location.end.line, location.end.column)
+        if token.begin >= end:
+            return tokens, item
+        tokens.extend(item)
+    return tokens, None
@@ -4,7 +4,7 @@
 # of the MIT license. See the LICENSE file for details.
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Sequence
 
 import attr
 
@@ -12,15 +12,72 @@ from gvm.locations import Location
 
 if TYPE_CHECKING:
     from gvm.language.grammar import TokenID
+    from gvm.language.parser import ParserError
+
+# Offset of token, that is not created from source buffer
+NO_OFFSET = -1
 
 
-@attr.dataclass
 class SyntaxToken:
+    """
+    Syntax token, e.g. terminal symbol in source text.
+
+    Token created by scanner is kept offsets of value in source buffer and the value is sliced lazily on first access.
+    Offsets of token created by constructor are optional. If they're not passed, offsets of token are `NO_OFFSET`,
+    e.g. token is not created from source buffer. Scanners are filtered and stitched only tokens created from buffer.
+    """
+    __slots__ = ('id', 'location', 'begin', 'end', '__buffer', '__value')
+
     id: TokenID
-    value: str
     location: Location
+    begin: int
+    end: int
+
+    def __init__(self, id: TokenID, value: str, location: Location, *, begin: int = NO_OFFSET, end: int = NO_OFFSET):
+        if (begin, end) != (NO_OFFSET, NO_OFFSET) and (begin < 0 or end - begin != len(value)):
+            raise ValueError('Offsets of token are not matched to length of value')
+        self.id = id
+        self.location = location
+        self.begin = begin
+        self.end = end
+        self.__buffer = None
+        self.__value = value
+
+    @classmethod
+    def from_buffer(cls, id: TokenID, buffer: str, begin: int, end: int, location: Location) -> SyntaxToken:
+        """ Create token for value from source buffer, e.g. `buffer[begin:end]` """
+        token = cls.__new__(cls)
+        token.id = id
+        token.location = location
+        token.begin = begin
+        token.end = end
+        token.__buffer = buffer
+        token.__value = None
+        return token
+
+    @property
+    def value(self) -> str:
+        if self.__value is None:
+            self.__value = self.__buffer[self.begin:self.end]
+            self.__buffer = None
+        return self.__value
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.id, self.value, self.location) == (other.id, other.value, other.location)
+
+    def __repr__(self) -> str:
+        return f'SyntaxToken(id={self.id!r}, value={self.value!r}, location={self.location!r})'
 
 
 @attr.dataclass
 class SyntaxNode:
     pass
+
+
+@attr.dataclass
+class ErrorNode(SyntaxNode):
+    """ This node is inserted by parser in recovery mode instead of skipped tokens """
+    error: ParserError
+    tokens: Sequence[SyntaxToken]
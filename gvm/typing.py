@@ -4,6 +4,7 @@
 # of the MIT license. See the LICENSE file for details.
 from __future__ import annotations
 
+import inspect
 from collections.abc import Sequence
 from typing import Type, Sequence as TypeSequence, Optional
 
@@ -26,11 +27,28 @@ def merge_sequence_type(lhs: Type, rhs: Type) -> Type:
     lhs = unpack_type_argument(lhs)
     rhs = unpack_type_argument(rhs)
     if lhs != rhs:
-        raise TypeError(f"Can not merge types: lhs and rhs")
+        raise TypeError(f"Can not merge types: {lhs} and {rhs}")
 
     return TypeSequence[lhs]
 
 
+def merge_choice_type(lhs: Type, rhs: Type) -> Type:
+    """ Combine types of alternatives, e.g. returns nearest common type """
+    if lhs == rhs:
+        return lhs
+    if is_sequence_type(lhs) != is_sequence_type(rhs):
+        # value of scalar alternative is not sequence, e.g. it can not be stored in variable of sequence type
+        raise TypeError(f"Can not merge types of sequence and scalar alternatives: {lhs} and {rhs}")
+    if is_sequence_type(lhs):
+        return merge_sequence_type(lhs, rhs)
+
+    is_optional = is_optional_type(lhs) or is_optional_type(rhs)
+    lhs = unpack_type_argument(lhs)
+    rhs = unpack_type_argument(rhs)
+    typ = next(base for base in inspect.getmro(lhs) if issubclass(rhs, base))
+    return Optional[typ] if is_optional else typ
+
+
 def make_sequence_type(typ: Type) -> TypeSequence:
     typ = unpack_type_argument(typ)
     return TypeSequence[typ]
@@ -2,14 +2,17 @@
 #
 # This software may be modified and distributed under the terms
 # of the MIT license. See the LICENSE file for details.
-from typing import Optional, Sequence
+from typing import Optional, Sequence, Tuple
 
 import pytest
 
 from gvm.language.combinators import flat_combinator, make_sequence, TokenCombinator, ParseletCombinator, flat_sequence, \
     SequenceCombinator, make_named, make_optional, OptionalCombinator, make_repeat, RepeatCombinator, make_token, \
-    make_parselet
-from gvm.language.grammar import Grammar
+    make_parselet, make_separated, SeparatedCombinator, make_choice, ChoiceCombinator, make_memo, MemoCombinator
+from gvm.language.actions import make_return_variable, make_call
+from gvm.language.grammar import Grammar, GrammarError
+from gvm.language.parser import Parser, ParserError, MemoizationMode, ParserProfile
+from gvm.language.scanner import DefaultScanner
 from gvm.language.syntax import SyntaxToken, SyntaxNode
 
 
@@ -157,3 +160,207 @@ def test_variables():
     comb = make_named('names', make_repeat(name_id))
     assert 'names' in comb.variables
     assert comb.variables['names'] == Sequence[SyntaxToken]
+
+
+def test_accumulate_variables():
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    names_id = grammar.add_parser(
+        'names', 'names:Name { "," names:Name } ";" names:{ Name }', make_return_variable('names'))
+
+    scanner = DefaultScanner(grammar, '<example>', ', '.join(f'n{idx}' for idx in range(1000)) + '; a b')
+    result = Parser(scanner).parse(names_id)
+    assert isinstance(result, tuple)
+    assert [token.value for token in result] == [f'n{idx}' for idx in range(1000)] + ['a', 'b']
+
+
+def test_make_separated():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+    comma_id = grammar.add_implicit(',')
+
+    comb = make_separated(make_named('names', name_id), comma_id)
+    assert isinstance(comb, SeparatedCombinator)
+    assert comb.result_type == Sequence[SyntaxToken]
+    assert comb.variables == {'names': Sequence[SyntaxToken]}
+    assert not comb.is_trailing
+    assert make_separated(name_id, comma_id, allow_trailing=True).is_trailing
+
+
+@pytest.mark.parametrize('combinator,content,expected', [
+    ('{ names:Name % "," }', '', []),
+    ('{ names:Name % "," }', 'a', ['a']),
+    ('{ names:Name % "," }', 'a, b, c', ['a', 'b', 'c']),
+    ('{ names:Name % "," } [ "," ]', 'a, b,', ['a', 'b']),
+    ('{ names:Name % "," % }', 'a, b,', ['a', 'b']),
+    ('{ names:Name % "," % } ";"', 'a, b, ;', ['a', 'b']),
+    ('{ names:Name % "," % } ";"', 'a, b ;', ['a', 'b']),
+    ('{ "(" ~ names:Name ")" % "," } ";"', '(a), (b) ;', ['a', 'b']),
+    ('{ "(" ~ names:Name ")" % "," % } ";"', '(a), (b), ;', ['a', 'b']),
+])
+def test_separated_combinator(combinator: str, content: str, expected: Sequence[str]):
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    names_id = grammar.add_parser('names', combinator, make_return_variable('names'))
+
+    result = Parser(DefaultScanner(grammar, '<example>', content)).parse(names_id)
+    assert [token.value for token in result] == expected
+
+
+def test_separated_combinator_fail():
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    names_id = grammar.add_parser('names', '{ names:Name % "," }', make_return_variable('names'))
+
+    with pytest.raises(ParserError) as exc_info:
+        Parser(DefaultScanner(grammar, '<example>', 'a, b,')).parse(names_id)
+    assert exc_info.value.actual_token == grammar.tokens['<EOF>']
+    assert exc_info.value.expected_tokens == {grammar.tokens['Name']}
+
+
+def test_separated_combinator_cut_fail():
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    names_id = grammar.add_parser('names', '{ "(" ~ names:Name ")" % "," % }', make_return_variable('names'))
+
+    # committed element is not backtracked, e.g. separator is not matched as trailing
+    with pytest.raises(ParserError) as exc_info:
+        Parser(DefaultScanner(grammar, '<example>', '(a), ((b))')).parse(names_id)
+    assert exc_info.value.actual_token == grammar.tokens['(']
+    assert exc_info.value.expected_tokens == {grammar.tokens['Name']}
+
+
+def test_combinator_children():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+    comma_id = grammar.add_token('Comma')
+
+    name = make_token(name_id)
+    comma = make_token(comma_id)
+    separated = make_separated(name, comma)
+    assert name.children == ()
+    assert separated.children == (name, comma)
+    assert make_optional(separated).children == (separated,)
+    assert make_sequence(name, comma).children == (name, comma)
+
+
+def test_make_choice():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+    number_id = grammar.add_token('Number')
+
+    comb = make_choice(make_named('name', name_id), make_choice(number_id, make_named('name', number_id)))
+    assert isinstance(comb, ChoiceCombinator)
+    assert len(comb) == 3
+    assert comb.result_type == SyntaxToken
+    assert comb.variables == {'name': Optional[SyntaxToken]}
+    assert make_choice(name_id) == make_token(name_id)
+
+
+def test_choice_first():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+    number_id = grammar.add_token('Number')
+    comma_id = grammar.add_implicit(',')
+    expr_id = grammar.add_parser('expr', make_choice(name_id, number_id))
+    grammar.add_parser('items', make_choice(make_sequence(make_optional(comma_id), expr_id), comma_id))
+
+    analysis = grammar.analysis
+    assert analysis.firsts[expr_id] == {name_id, number_id}
+    assert not analysis.nullables[expr_id]
+    assert analysis.firsts[grammar.parselets['items']] == {name_id, number_id, comma_id}
+
+
+@pytest.mark.parametrize('content,expected', [
+    ('a', ('name', 'a')),
+    ('1', ('number', '1')),
+    ('a = 1', ('assign', '1')),
+])
+def test_choice_combinator(content: str, expected: Tuple[str, str]):
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    stmt_id = grammar.add_parser(
+        'stmt',
+        'assign:(Name "=" Number) | name:Name | number:Number',
+        make_call(lambda **kwargs: next((name, token.value) for name, token in kwargs.items() if token), tuple)
+    )
+
+    result = Parser(DefaultScanner(grammar, '<example>', content)).parse(stmt_id)
+    assert result == expected
+
+
+def test_choice_combinator_fail():
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    stmt_id = grammar.add_parser('stmt', '(Name "=" Number) | Name | Number')
+
+    with pytest.raises(ParserError) as exc_info:
+        Parser(DefaultScanner(grammar, '<example>', '=')).parse(stmt_id)
+    assert exc_info.value.actual_token == grammar.tokens['=']
+    assert exc_info.value.expected_tokens == {grammar.tokens['Name'], grammar.tokens['Number']}
+
+
+
+@pytest.mark.parametrize('combinator', ['v:( ";" { Name } | Name )', '( Name | { Number } )'])
+def test_choice_combinator_sequence_and_scalar(combinator: str):
+    grammar = Grammar()
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+
+    with pytest.raises(GrammarError):
+        grammar.add_parser('stmt', combinator)
+
+
+@pytest.mark.parametrize('combinator,calls', [
+    ('name:Name "=" value:value', 2),
+    ('@(name:Name "=" value:value)', 1),
+])
+def test_memo_combinator(combinator: str, calls: int):
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    value_id = grammar.add_parselet('value', result_type=SyntaxToken, memoization=MemoizationMode.Off)
+    grammar.add_parser(value_id, 'Number')
+    grammar.add_parser(value_id, 'Name')
+
+    # alternatives with common prefix
+    grammar.add_parser(
+        'stmt', f'({combinator} ";") | ({combinator} ".")', make_call(lambda name, value: (name.value, value.value), tuple)
+    )
+
+    profile = ParserProfile()
+    parser = Parser(DefaultScanner(grammar, '<example>', 'a = 1 .'), profile=profile)
+    assert parser.parse(grammar.parselets['stmt']) == ('a', '1')
+    assert profile.parselets[value_id].calls == calls
+
+
+def test_memo_combinator_key():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+    stmt_id = grammar.add_parser('stmt', '@(name:Name) ";"', make_return_variable('name'))
+    context = grammar.tables[stmt_id].parselets[0]
+
+    # memo combinators are not interned, e.g. they're created by optimizer
+    lhs = make_memo(make_named('name', name_id))
+    rhs = make_memo(make_named('name', name_id))
+    assert lhs is not rhs
+    assert lhs.get_memo_key(context) == rhs.get_memo_key(context)
+
+
+def test_make_memo():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+
+    comb = make_memo(make_named('names', make_repeat(name_id)))
+    assert isinstance(comb, MemoCombinator)
+    assert comb.result_type == Sequence[SyntaxToken]
+    assert comb.variables == {'names': Sequence[SyntaxToken]}
@@ -74,6 +74,16 @@ def test_add_incorrect_token():
     assert len(grammar.symbols) == symbol_count, "Count of symbols in grammar is changed after failed call"
 
 
+def test_symbol_ids_are_dense():
+    grammar = Grammar()
+    grammar.add_token('Name')
+    grammar.add_parselet('expr')
+    grammar.add_implicit('+')
+    grammar.add_parselet('stmt')
+
+    assert [symbol_id.id for symbol_id in grammar.symbols.values()] == list(range(len(grammar.symbols)))
+
+
 def test_add_trivia():
     grammar = Grammar()
     token_id = grammar.add_token('Whitespace')
@@ -168,6 +178,10 @@ def test_add_pratt_parser():
     assert string_id in table.prefix_tokens, "Cleanup of pratt table prefix tokens is not worked"
     assert grammar.add_parser(expr_id, make_sequence(expr_id, plus_id, expr_id))
     assert grammar.add_parser(expr_id, make_sequence(make_named('lhs', expr_id), make_named('op', star_id), expr_id))
+    assert table.prefix_table[integer_id.id] == table.prefixes[integer_id]
+    assert table.prefix_table[string_id.id] == table.prefixes[string_id]
+    assert table.postfix_table[plus_id.id] == table.postfixes[plus_id]
+    assert table.postfix_table[star_id.id] == table.postfixes[star_id]
 
 
 def test_add_fast_parser():
@@ -234,6 +248,25 @@ def test_extend_implicit_grammar():
     assert result.patterns[0].is_implicit
 
 
+def test_add_keyword():
+    grammar = Grammar()
+    name_id = grammar.add_pattern(grammar.add_token('Name'), r'[a-z]+')
+    keyword_id = grammar.add_keyword(name_id, 'def')
+    assert keyword_id == grammar.tokens['def']
+    assert keyword_id.is_implicit
+    assert grammar.keywords == {name_id: {'def': keyword_id}}
+
+    with pytest.raises(GrammarError):
+        grammar.add_keyword(name_id, 'if-else')
+
+
+def test_extend_keywords_grammar():
+    grammar1 = Grammar()
+    grammar1.add_keyword(grammar1.add_pattern(grammar1.add_token('Name'), r'[a-z]+'), 'def')
+    result = Grammar.merge(grammar1)
+    assert result.keywords == {result.tokens['Name']: {'def': result.tokens['def']}}
+
+
 def test_extend_trivia_grammar():
     grammar1 = Grammar()
     grammar1.add_trivia(grammar1.add_token('A'))
@@ -290,3 +323,25 @@ def test_extend_fail_grammar():
 
     with pytest.raises(GrammarError):
         Grammar.merge(grammar1, grammar2)
+
+
+def test_intern_combinators():
+    grammar = Grammar()
+    grammar.add_token('Name')
+    grammar.add_token('Number')
+    grammar.add_parser('first', 'name:Name [ "(" Number ")" ] ";"')
+    grammar.add_parser('second', 'name:Name [ "(" Number ")" ] "."')
+
+    first = grammar.tables[grammar.parselets['first']].parselets[0].combinator
+    second = grammar.tables[grammar.parselets['second']].parselets[0].combinator
+    assert first is not second
+    assert first[0] is second[0]
+    assert first[1] is second[1]
+    assert grammar.intern_combinator(make_named('name', grammar.tokens['Name'])) is first[0]
+
+    # merged grammar has own interned combinators
+    result = Grammar.merge(grammar)
+    merged_first = result.tables[result.parselets['first']].parselets[0].combinator
+    merged_second = result.tables[result.parselets['second']].parselets[0].combinator
+    assert merged_first == first
+    assert merged_first[1] is merged_second[1]
@@ -7,7 +7,8 @@ import pytest
 from gvm.exceptions import DiagnosticError
 from gvm.language import Grammar
 from gvm.language.combinators import TokenCombinator, ParseletCombinator, OptionalCombinator, RepeatCombinator, \
-    NamedCombinator
+    NamedCombinator, SeparatedCombinator, ChoiceCombinator, SequenceCombinator, CutCombinator, \
+    MemoCombinator
 from gvm.language.helpers import make_combinator
 
 
@@ -105,3 +106,54 @@ def test_parse_named_combinator():
     assert isinstance(result, NamedCombinator)
     assert isinstance(result.combinator, TokenCombinator)
     assert result.combinator.token_id == token_id
+
+
+def test_parse_separated_combinator():
+    # comb := '{' seq '%' seq [ '%' ] '}'
+    grammar = Grammar()
+    token_id = grammar.add_token('Name')
+    result = make_combinator(grammar, '{ Name % "," }')
+    assert isinstance(result, SeparatedCombinator)
+    assert isinstance(result.combinator, TokenCombinator)
+    assert result.combinator.token_id == token_id
+    assert isinstance(result.separator, TokenCombinator)
+    assert result.separator.token_id == grammar.tokens[',']
+    assert not result.is_trailing
+
+    result = make_combinator(grammar, '{ Name % "," % }')
+    assert isinstance(result, SeparatedCombinator)
+    assert result.is_trailing
+
+
+def test_parse_choice_combinator():
+    # comb := seq { '|' seq }
+    grammar = Grammar()
+    token_id = grammar.add_token('Name')
+    result = make_combinator(grammar, 'Name | "(" Name ")"')
+    assert isinstance(result, ChoiceCombinator)
+    assert isinstance(result[0], TokenCombinator)
+    assert result[0].token_id == token_id
+    assert isinstance(result[1], SequenceCombinator)
+
+    result = make_combinator(grammar, '[ Name | "," ]')
+    assert isinstance(result, OptionalCombinator)
+    assert isinstance(result.combinator, ChoiceCombinator)
+
+
+def test_parse_cut_combinator():
+    # comb := '~'
+    grammar = Grammar()
+    grammar.add_token('Name')
+    result = make_combinator(grammar, '"(" ~ Name ")"')
+    assert isinstance(result, SequenceCombinator)
+    assert isinstance(result[1], CutCombinator)
+
+
+def test_parse_memo_combinator():
+    # comb := '@' comb
+    grammar = Grammar()
+    grammar.add_token('Name')
+    result = make_combinator(grammar, '@(Name ":") Name')
+    assert isinstance(result, SequenceCombinator)
+    assert isinstance(result[0], MemoCombinator)
+    assert isinstance(result[0].combinator, SequenceCombinator)
@@ -0,0 +1,161 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+import re
+from io import StringIO
+from typing import Pattern
+
+import pytest
+
+from gvm.core import RE_NAME
+from gvm.language.grammar import Grammar
+from gvm.language.lint import lint_grammar, LintKind, measure_pattern_growth, iter_pattern_pumps
+from gvm.language.parser import MemoizationMode
+from gvm.language.printer import dump_lint_report
+from gvm.language.scanner import sre_parse
+from gvm.language.syntax import SyntaxToken
+
+
+def linear_timer(pattern: Pattern, content: str) -> float:
+    """ Fake time of match, that is grown linearly for all patterns """
+    return len(content) * 1e-6
+
+
+def nested_timer(pattern: Pattern, content: str) -> float:
+    """ Fake time of match, that is grown quadratically for patterns with nested or adjacent quantifiers """
+    if pattern.pattern in {r'(a+)+b', r'@a*a*b'}:
+        return len(content) ** 2 * 1e-6
+    return linear_timer(pattern, content)
+
+
+def cubic_timer(pattern: Pattern, content: str) -> float:
+    """ Fake time of match, that is grown cubically for all patterns """
+    return len(content) ** 3 * 1e-9
+
+
+@pytest.fixture
+def grammar() -> Grammar:
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    grammar.add_parser('stmt', '"print" Number ";"')
+    grammar.add_parser('stmt', 'Name "=" Number ";"')
+    grammar.add_parser('module', '{ stmt }')
+    return grammar
+
+
+def test_lint_grammar(grammar: Grammar):
+    assert lint_grammar(grammar, [grammar.parselets['module']], timer=linear_timer) == []
+
+
+def test_lint_overlapped_alternatives(grammar: Grammar):
+    grammar.add_parser('stmt', 'Name ";"')
+    grammar.add_parser('expr', '( Name ";" | Name "." )')
+    warnings = lint_grammar(grammar, timer=linear_timer)
+    assert [warning.kind for warning in warnings] == [LintKind.OverlappedAlternatives] * 2
+    assert warnings[0].parselets == tuple(grammar.tables[grammar.parselets['stmt']].parselets[1:])
+    assert warnings[0].message.endswith(': Name')
+
+
+def test_lint_nullable_repeat(grammar: Grammar):
+    grammar.add_parser('block', '"{" { [ stmt ] } "}"')
+    warnings = lint_grammar(grammar, timer=linear_timer)
+    assert [warning.kind for warning in warnings] == [LintKind.NullableRepeat]
+    assert warnings[0].parselets == tuple(grammar.tables[grammar.parselets['block']].parselets)
+
+
+def test_lint_unreachable_parselet(grammar: Grammar):
+    grammar.add_parser('expr', 'Name')
+    warnings = lint_grammar(grammar, [grammar.parselets['module']], timer=linear_timer)
+    assert [warning.kind for warning in warnings] == [LintKind.UnreachableParselet]
+    assert warnings[0].location == grammar.parselets['expr'].location
+
+
+@pytest.mark.parametrize('is_optimized', [True, False])
+def test_lint_rescanning(grammar: Grammar, is_optimized: bool):
+    grammar.add_parselet('expr', result_type=SyntaxToken, memoization=MemoizationMode.Off)
+    grammar.add_parser('expr', 'Name')
+    grammar.add_parser('expr', 'Number')
+    grammar.add_parser('assign', 'target:expr "=" value:expr ";"')
+    grammar.add_parser('assign', 'targets:expr "+=" value:expr ";"')
+    grammar.is_optimized = is_optimized
+
+    warnings = lint_grammar(grammar, timer=linear_timer)
+    warnings = [warning for warning in warnings if warning.kind == LintKind.Rescanning]
+    assert len(warnings) == 1
+    assert warnings[0].parselets == tuple(grammar.tables[grammar.parselets['assign']].parselets)
+
+
+def test_lint_factored_not_rescanning(grammar: Grammar):
+    grammar.add_parselet('expr', result_type=SyntaxToken, memoization=MemoizationMode.Off)
+    grammar.add_parser('expr', 'Name')
+    grammar.add_parser('expr', 'Number')
+    grammar.add_parser('assign', 'target:expr "=" value:expr ";"')
+    grammar.add_parser('assign', 'target:expr "+=" value:expr ";"')
+
+    assert not any(warning.kind == LintKind.Rescanning for warning in lint_grammar(grammar, timer=linear_timer))
+
+
+def test_dump_lint_report(grammar: Grammar):
+    grammar.add_parser('stmt', 'Name ";"')
+    stream = StringIO()
+    dump_lint_report(stream, lint_grammar(grammar, timer=linear_timer))
+    lines = stream.getvalue().splitlines()
+    assert len(lines) == 3
+    assert 'warning[overlapped-alternatives]' in lines[0]
+    assert lines[1].startswith('    stmt := Name')
+
+
+def test_lint_catastrophic_pattern(grammar: Grammar):
+    grammar.add_pattern(grammar.add_token('Nested'), r'(a+)+b')
+    grammar.add_pattern(grammar.add_token('Quadratic'), r'@a*a*b')
+    warnings = lint_grammar(grammar, timer=nested_timer)
+    assert [warning.kind for warning in warnings] == [LintKind.CatastrophicPattern] * 2
+    assert [warning.patterns[0].token_id.name for warning in warnings] == ['Nested', 'Quadratic']
+    assert warnings[0].message.endswith("on input '' + 'a' * n")
+    assert warnings[1].message.endswith("on input '@' + 'a' * n")
+
+
+@pytest.mark.parametrize('pattern,pumps,suffix', [
+    (r'(a+)+b', [('', 'a')], 'b'),
+    (r'@a*a*b', [('@', 'a')], 'b'),
+    (RE_NAME, [('a', 'a'), ('a', '!')], ''),
+])
+def test_iter_pattern_pumps(pattern: str, pumps, suffix: str):
+    assert list(dict.fromkeys(iter_pattern_pumps(sre_parse.parse(pattern)))) == pumps
+    # pumped input is consumed by quantifier, i.e. it is matched in full once suffix is restored
+    for prefix, pump in pumps:
+        assert re.fullmatch(pattern, prefix + pump * 8 + suffix)
+
+
+@pytest.mark.parametrize('timer', [
+    lambda pattern, content: 1e-3 if len(content) > 20 else 1e-6,  # single jump of time, e.g. noise
+    lambda pattern, content: 1e-3 if len(content) % 2 else 2e-3,  # time is not grown on each step
+])
+def test_measure_pattern_growth_not_grown(timer):
+    assert measure_pattern_growth(re.compile(r'a*b'), '', 'a', 4096, 1e-4, timer) is None
+
+
+def test_measure_pattern_growth():
+    exponent = measure_pattern_growth(re.compile(r'a*b'), '', 'a', 4096, 1e-4, cubic_timer)
+    assert 2.5 < exponent < 3.0
+
+
+def test_lint_shadowed_pattern(grammar: Grammar):
+    grammar.add_pattern(grammar.add_token('Keyword'), r'print')
+    grammar.add_pattern(grammar.add_token('Integer'), r'[0-9]+')
+    warnings = lint_grammar(grammar, timer=linear_timer)
+    assert [warning.kind for warning in warnings] == [LintKind.ShadowedPattern] * 2
+    assert [[pattern.token_id.name for pattern in warning.patterns] for warning in warnings] == [
+        ['print', 'Keyword'], ['Number', 'Integer']
+    ]
+
+
+@pytest.mark.parametrize('is_optimized', [True, False])
+def test_drop_shadowed_patterns(grammar: Grammar, is_optimized: bool):
+    grammar.add_pattern(grammar.add_token('Integer'), r'[0-9]+')
+    grammar.is_optimized = is_optimized
+    token_ids = [token_id for _, token_id in grammar.scanner_table.patterns]
+    assert (grammar.tokens['Integer'] in token_ids) != is_optimized
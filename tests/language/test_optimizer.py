@@ -0,0 +1,115 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+import pytest
+
+from gvm.language.actions import make_call, make_return_variable
+from gvm.language.combinators import make_token, make_named, make_repeat
+from gvm.language.grammar import Grammar
+from gvm.language.helpers import combinator_grammar
+from gvm.language.optimizer import FactoredParselet
+from gvm.language.parser import Parser, MemoizationMode, ParserProfile
+from gvm.language.scanner import DefaultScanner
+from gvm.language.syntax import SyntaxToken
+
+
+def make_stmt(kind: str):
+    return make_call(lambda name, value: (kind, value.value), tuple)
+
+
+@pytest.fixture
+def grammar() -> Grammar:
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    value_id = grammar.add_parselet('value', result_type=SyntaxToken, memoization=MemoizationMode.Off)
+    grammar.add_parser(value_id, 'Number')
+    grammar.add_parser(value_id, 'Name')
+
+    # stmt := name:Name '=' value:value ';'
+    # stmt := name:Name '=' value:value '.'
+    # stmt := name:Name '=' value:value
+    grammar.add_parser('stmt', 'name:Name "=" value:value ";"', make_stmt('end'))
+    grammar.add_parser('stmt', 'name:Name "=" value:value "."', make_stmt('dot'))
+    grammar.add_parser('stmt', 'name:Name "=" value:value', make_stmt('none'))
+    return grammar
+
+
+def test_factor_parselets(grammar: Grammar):
+    table = grammar.tables[grammar.parselets['stmt']]
+    alternatives = table.get_alternatives(grammar.optimizer)
+    assert len(table.parselets) == 3
+    assert len(alternatives) == 1
+    assert isinstance(alternatives[0], FactoredParselet)
+    assert [parselet for _, parselet in alternatives[0].alternatives] == table.parselets
+
+    # combinator grammar has alternatives with common prefix, e.g. `name:Name`
+    table = combinator_grammar.tables[combinator_grammar.parselets['combinator']]
+    assert len(table.get_alternatives(combinator_grammar.optimizer)) < len(table.parselets)
+
+
+@pytest.mark.parametrize('content,expected', [
+    ('a = 1;', ('end', '1')),
+    ('a = 1.', ('dot', '1')),
+    ('a = 1', ('none', '1')),
+])
+def test_parse_factored_parselet(grammar: Grammar, content: str, expected):
+    profile = ParserProfile()
+    parser = Parser(DefaultScanner(grammar, '<example>', content), profile=profile)
+    assert parser.parse(grammar.parselets['stmt']) == expected
+    assert profile.parselets[grammar.parselets['value']].calls == 1
+
+
+def test_not_factor_different_variables():
+    grammar = Grammar()
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_parser('stmt', 'name:Name "=" name:Name')
+    grammar.add_parser('stmt', 'name:Name ":"')
+
+    table = grammar.tables[grammar.parselets['stmt']]
+    assert table.get_alternatives(grammar.optimizer) == table.parselets
+
+
+@pytest.fixture
+def inline_grammar() -> Grammar:
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+
+    # name := Name
+    # variable := name
+    # args := variables:{ variable }
+    name_id = grammar.add_parser('name', 'Name')
+    variable_id = grammar.add_parser('variable', 'name')
+    grammar.add_parser('args', 'variables:{ variable }', make_return_variable('variables'))
+
+    # recursive parselets are not inlined
+    grammar.add_parselet('second', result_type=SyntaxToken)
+    grammar.add_parser('first', 'second')
+    grammar.add_parser('second', 'first')
+
+    assert name_id.result_type == variable_id.result_type == SyntaxToken
+    return grammar
+
+
+def test_find_inlines(inline_grammar: Grammar):
+    inlines = inline_grammar.optimizer.inlines
+    assert set(inlines) == {inline_grammar.parselets['name'], inline_grammar.parselets['variable']}
+    assert inlines[inline_grammar.parselets['variable']] == make_token(inline_grammar.tokens['Name'])
+
+    table = inline_grammar.tables[inline_grammar.parselets['args']]
+    combinator = table.get_alternatives(inline_grammar.optimizer)[0].combinator
+    assert combinator == make_named('variables', make_repeat(inline_grammar.tokens['Name']))
+
+
+@pytest.mark.parametrize('is_optimized', [True, False])
+def test_parse_inlined_parselet(inline_grammar: Grammar, is_optimized: bool):
+    inline_grammar.is_optimized = is_optimized
+    assert bool(inline_grammar.optimizer.inlines) == is_optimized
+
+    profile = ParserProfile()
+    parser = Parser(DefaultScanner(inline_grammar, '<example>', 'a b c'), profile=profile)
+    assert [token.value for token in parser.parse(inline_grammar.parselets['args'])] == ['a', 'b', 'c']
+    assert bool(profile.parselets[inline_grammar.parselets['variable']].calls) != is_optimized
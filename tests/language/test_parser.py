@@ -2,12 +2,15 @@
 #
 # This software may be modified and distributed under the terms
 # of the MIT license. See the LICENSE file for details.
+from typing import Sequence
+
 import pytest
 
-from gvm.language import DefaultScanner
+from gvm.language import DefaultScanner, IndentationScanner
 from gvm.language.actions import make_call, make_return_variable
 from gvm.language.grammar import Grammar, ParseletKind
-from gvm.language.parser import Parser, ParserError
+from gvm.language.parser import Parser, ParserError, MemoizationMode, ParserProfile
+from gvm.language.syntax import ErrorNode
 
 
 @pytest.fixture
@@ -59,44 +62,69 @@ def grammar() -> Grammar:
     return grammar
 
 
-def parse_expr(grammar: Grammar, content: str):
+def parse_expr(grammar: Grammar, content: str, *, contextual: bool = False):
     scanner = DefaultScanner(grammar, '<example>', content)
-    parser = Parser(scanner)
+    parser = Parser(scanner, contextual=contextual)
     result = parser.parse(grammar.parselets['expr'])
     return result
 
 
-def test_pratt_expr_parser(grammar: Grammar):
+@pytest.mark.parametrize('contextual', [False, True])
+def test_pratt_expr_parser(grammar: Grammar, contextual: bool):
+    def parse(content: str):
+        return parse_expr(grammar, content, contextual=contextual)
+
     # prefix and unary expr
-    assert parse_expr(grammar, '1') == '1'
-    assert parse_expr(grammar, '+1') == ('+', '1')
-    assert parse_expr(grammar, '-1') == ('-', '1')
-    assert parse_expr(grammar, '(1)') == '1'
+    assert parse('1') == '1'
+    assert parse('+1') == ('+', '1')
+    assert parse('-1') == ('-', '1')
+    assert parse('(1)') == '1'
 
     # postfix and binary expr
-    assert parse_expr(grammar, '1 + 2') == ('1', '+', '2')
-    assert parse_expr(grammar, '1 - 2') == ('1', '-', '2')
-    assert parse_expr(grammar, '1 * 2') == ('1', '*', '2')
-    assert parse_expr(grammar, '1 / 2') == ('1', '/', '2')
+    assert parse('1 + 2') == ('1', '+', '2')
+    assert parse('1 - 2') == ('1', '-', '2')
+    assert parse('1 * 2') == ('1', '*', '2')
+    assert parse('1 / 2') == ('1', '/', '2')
 
     # priority parsers, e.g. associativity and precedence
-    assert parse_expr(grammar, '1 + 2 + 3') == (('1', '+', '2'), '+', '3')
-    assert parse_expr(grammar, '1 * 2 * 3') == (('1', '*', '2'), '*', '3')
-    assert parse_expr(grammar, '1 ** 2 ** 3') == ('1', '**', ('2', '**', '3'))
+    assert parse('1 + 2 + 3') == (('1', '+', '2'), '+', '3')
+    assert parse('1 * 2 * 3') == (('1', '*', '2'), '*', '3')
+    assert parse('1 ** 2 ** 3') == ('1', '**', ('2', '**', '3'))
 
-    assert parse_expr(grammar, '1 + 2 * 3') == ('1', '+', ('2', '*', '3'))
-    assert parse_expr(grammar, '1 * 2 + 3') == (('1', '*', '2'), '+', '3')
+    assert parse('1 + 2 * 3') == ('1', '+', ('2', '*', '3'))
+    assert parse('1 * 2 + 3') == (('1', '*', '2'), '+', '3')
 
     # complex expr
-    assert parse_expr(grammar, '-(1 + -2)') == ('-', ('1', '+', ('-', '2')))
-    assert parse_expr(grammar, '(1 - 2 / 3)') == ('1', '-', ('2', '/', '3'))
-    assert parse_expr(grammar, '-1 * 2') == (('-', '1'), '*', '2')
-    assert parse_expr(grammar, '(4 * +1) / 2') == (('4', '*', ('+', '1')), '/', '2')
+    assert parse('-(1 + -2)') == ('-', ('1', '+', ('-', '2')))
+    assert parse('(1 - 2 / 3)') == ('1', '-', ('2', '/', '3'))
+    assert parse('-1 * 2') == (('-', '1'), '*', '2')
+    assert parse('(4 * +1) / 2') == (('4', '*', ('+', '1')), '/', '2')
+
+
+def test_parse_tokenized_buffer(grammar: Grammar):
+    scanner = DefaultScanner(grammar, '<example>', '1 + 2 * 3')
+    parser = Parser(scanner, tokens=scanner.tokenize_all())
+    assert parser.parse(grammar.parselets['expr']) == ('1', '+', ('2', '*', '3'))
+
+
+def test_parse_tokenized_buffer_without_eof(grammar: Grammar):
+    scanner = DefaultScanner(grammar, '<example>', '1 + 2 * 3')
+    with pytest.raises(ValueError):
+        Parser(scanner, tokens=scanner.tokenize_all()[:-1])
 
 
-def test_expr_parse_invalid_name(grammar: Grammar):
+@pytest.mark.parametrize('contextual', [False, True])
+def test_expr_parse_longer_follow_token(grammar: Grammar, contextual: bool):
+    # `--` is followed expression, therefore it's not lexed as postfix `-`
+    stmt_id = grammar.add_parser('stmt', 'lhs:expr "--" rhs:expr', make_call(lambda lhs, rhs: (lhs, '--', rhs), object))
+    scanner = DefaultScanner(grammar, '<example>', '1 -- 2')
+    assert Parser(scanner, contextual=contextual).parse(stmt_id) == ('1', '--', '2')
+
+
+@pytest.mark.parametrize('contextual', [False, True])
+def test_expr_parse_invalid_name(grammar: Grammar, contextual: bool):
     with pytest.raises(ParserError) as exc_info:
-        parse_expr(grammar, 'a')
+        parse_expr(grammar, 'a', contextual=contextual)
     ex = exc_info.value
     assert ex.actual_token == grammar.tokens['Name']
     assert ex.expected_tokens == {
@@ -105,3 +133,215 @@ def test_expr_parse_invalid_name(grammar: Grammar):
         grammar.tokens['-'],
         grammar.tokens['Number'],
     }
+
+
+@pytest.fixture
+def stmt_grammar() -> Grammar:
+    grammar = Grammar()
+
+    whitespace_id = grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+')
+    grammar.add_trivia(whitespace_id)
+
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    grammar.add_brackets(grammar.add_implicit('('), grammar.add_implicit(')'))
+    grammar.add_synchronization(grammar.add_implicit(';'))
+
+    # stmt := name:Name '=' value:Number ';'
+    grammar.add_parser('stmt', 'name:Name "=" value:Number ";"', make_call(lambda name, value: name.value, object))
+
+    # module := stmts:{ stmt }
+    grammar.add_parser('module', 'stmts:{ stmt }', make_return_variable('stmts'))
+
+    return grammar
+
+
+def parse_module(grammar: Grammar, content: str, *, recovery: bool = False, contextual: bool = False):
+    scanner = DefaultScanner(grammar, '<example>', content)
+    parser = Parser(scanner, recovery=recovery, contextual=contextual)
+    result = parser.parse(grammar.parselets['module'])
+    return result, parser.errors
+
+
+def test_parse_without_recovery(stmt_grammar: Grammar):
+    assert parse_module(stmt_grammar, 'a = 1; b = 2;') == (('a', 'b'), [])
+
+    with pytest.raises(ParserError):
+        parse_module(stmt_grammar, 'a = 1; b = ; c = 3;')
+
+
+@pytest.mark.parametrize('contextual', [False, True])
+def test_parse_with_recovery(stmt_grammar: Grammar, contextual: bool):
+    content = 'a = 1; b = ; c = 3; d ( ; ) 4; e = 5;'
+    result, errors = parse_module(stmt_grammar, content, recovery=True, contextual=contextual)
+    assert len(result) == 5
+    assert result[0] == 'a'
+    assert isinstance(result[1], ErrorNode)
+    assert [token.value for token in result[1].tokens] == ['b', '=', ';']
+    assert result[2] == 'c'
+    assert isinstance(result[3], ErrorNode)
+    assert [token.value for token in result[3].tokens] == ['d', '(', ';', ')', '4', ';']
+    assert result[4] == 'e'
+    assert errors == [result[1].error, result[3].error]
+    assert errors[0].actual_token == stmt_grammar.tokens[';']
+    assert errors[0].expected_tokens == {stmt_grammar.tokens['Number']}
+
+
+def test_parse_with_recovery_rest_tokens(stmt_grammar: Grammar):
+    # statements after unexpected tokens are parsed only for collecting errors, e.g. they're dropped from result
+    result, errors = parse_module(stmt_grammar, 'a = 1; ) b = 2; = c = 3;', recovery=True)
+    assert result == ('a',)
+    assert len(errors) == 2
+    assert errors[0].actual_token == stmt_grammar.tokens[')']
+    assert errors[1].actual_token == stmt_grammar.tokens['=']
+
+
+def test_parse_contextual():
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    grammar.add_keyword(grammar.tokens['Name'], 'let')
+    stmt_id = grammar.add_parser(
+        'stmt', '"let" name:Name "=" value:Name ";"', make_call(lambda name, value: (name.value, value.value), tuple))
+
+    # keyword is not expected after `let`, therefore it's lexed as name
+    parser = Parser(DefaultScanner(grammar, '<example>', 'let let = let;'), contextual=True)
+    assert parser.parse(stmt_id) == ('let', 'let')
+    with pytest.raises(ParserError):
+        Parser(DefaultScanner(grammar, '<example>', 'let let = let;')).parse(stmt_id)
+
+    # tokens of input stream are not matched expected tokens
+    with pytest.raises(ParserError) as exc_info:
+        Parser(DefaultScanner(grammar, '<example>', 'let a = 1;'), contextual=True).parse(stmt_id)
+    assert exc_info.value.actual_token == grammar.tokens['Number']
+    assert exc_info.value.expected_tokens == {grammar.tokens['Name']}
+    assert str(exc_info.value.location.begin) == '1:9'
+
+
+def test_parse_contextual_with_tokens(stmt_grammar: Grammar):
+    scanner = DefaultScanner(stmt_grammar, '<example>', 'a = 1;')
+    with pytest.raises(ValueError):
+        Parser(scanner, tokens=scanner.tokenize_all(), contextual=True)
+
+
+def test_parse_contextual_with_indentation(stmt_grammar: Grammar):
+    with pytest.raises(ValueError):
+        Parser(IndentationScanner(stmt_grammar, '<example>', 'a = 1;'), contextual=True)
+
+
+@pytest.fixture
+def cut_grammar() -> Grammar:
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    grammar.add_synchronization(grammar.add_implicit(';'))
+
+    # stmt := 'print' ~ value:Number ';'
+    # stmt := 'print' value:Name ';'
+    grammar.add_parser('stmt', '"print" ~ value:Number ";"', make_return_variable('value'))
+    grammar.add_parser('stmt', '"print" value:Name ";"', make_return_variable('value'))
+
+    # module := ~ stmts:{ stmt }
+    grammar.add_parser('module', '~ stmts:{ stmt }', make_return_variable('stmts'))
+    return grammar
+
+
+def test_parse_with_cut(cut_grammar: Grammar):
+    result, errors = parse_module(cut_grammar, 'print 1; print 2; print 3;')
+    assert [token.value for token in result] == ['1', '2', '3']
+    assert errors == []
+
+
+def test_parse_with_cut_fail(cut_grammar: Grammar):
+    # committed alternative is failed, therefore next alternative is not tried
+    with pytest.raises(ParserError) as exc_info:
+        parse_module(cut_grammar, 'print 1; print a;')
+    assert exc_info.value.actual_token == cut_grammar.tokens['Name']
+    assert exc_info.value.expected_tokens == {cut_grammar.tokens['Number']}
+
+
+def test_parse_with_cut_and_recovery(cut_grammar: Grammar):
+    result, errors = parse_module(cut_grammar, 'print 1; print a; print 3;', recovery=True)
+    assert len(result) == 3
+    assert isinstance(result[1], ErrorNode)
+    assert [token.value for token in result[1].tokens] == ['print', 'a', ';']
+    assert result[2].value == '3'
+    assert errors == [result[1].error]
+
+
+@pytest.mark.parametrize('pattern, content, names, count', [
+    ('{ ~ Name }', 'a b', ['a', 'b'], 1),
+    ('{ ~ Name }', 'a 1', ['a'], 2),
+    ('{ [ "x" ] ~ Name }', 'a x', ['a'], 2),
+])
+def test_parse_with_cut_and_recovery_at_end(pattern: str, content: str, names: Sequence[str], count: int):
+    # committed element is failed at end of input, therefore recovery can not move parser forward, but error is
+    # registered as in normal mode
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    grammar.add_parser('module', f'stmts:{pattern}', make_return_variable('stmts'))
+
+    with pytest.raises(ParserError):
+        parse_module(grammar, content)
+
+    result, errors = parse_module(grammar, content, recovery=True)
+    assert [item.value for item in result if not isinstance(item, ErrorNode)] == names
+    assert [item.error for item in result if isinstance(item, ErrorNode)] == errors
+    assert len(errors) == count
+    assert errors[-1].actual_token == grammar.tokens['<EOF>']
+
+
+def test_parse_optional_with_cut():
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+    call_id = grammar.add_parser('call', 'name:Name [ "(" ~ Number ")" ] ";"', make_return_variable('name'))
+
+    assert Parser(DefaultScanner(grammar, '<example>', 'f (1);')).parse(call_id).value == 'f'
+    with pytest.raises(ParserError) as exc_info:
+        Parser(DefaultScanner(grammar, '<example>', 'f ( ;')).parse(call_id)
+    assert exc_info.value.actual_token == grammar.tokens[';']
+    assert exc_info.value.expected_tokens == {grammar.tokens['Number']}
+
+
+@pytest.mark.parametrize('memoization', list(MemoizationMode))
+def test_parse_with_memoization(stmt_grammar: Grammar, memoization: MemoizationMode):
+    stmt_grammar.add_parselet('stmt', result_type=object, memoization=memoization)
+    assert stmt_grammar.tables[stmt_grammar.parselets['stmt']].memoization == memoization
+    assert parse_module(stmt_grammar, 'a = 1; b = 2;') == (('a', 'b'), [])
+
+
+def test_parse_with_profile(stmt_grammar: Grammar):
+    stmt_id = stmt_grammar.parselets['stmt']
+    profile = ParserProfile(min_lookups=2)
+    parser = Parser(DefaultScanner(stmt_grammar, '<example>', 'a = 1; b = 2; c = 3;'), profile=profile)
+    assert parser.parse(stmt_grammar.parselets['module']) == ('a', 'b', 'c')
+    assert profile.parselets[stmt_id].calls == 4
+    assert profile.parselets[stmt_id].lookups == 4
+    assert profile.parselets[stmt_id].hits == 0
+
+    # results of parselet are not memorized in auto mode, because it's never hit
+    assert not profile.is_memoized(stmt_id)
+    stmt_grammar.set_memoization(stmt_id, MemoizationMode.Auto)
+    parser = Parser(DefaultScanner(stmt_grammar, '<example>', 'a = 1; b = 2; c = 3;'), profile=profile)
+    assert parser.parse(stmt_grammar.parselets['module']) == ('a', 'b', 'c')
+    assert profile.parselets[stmt_id].calls == 8
+    assert profile.parselets[stmt_id].lookups == 4
+
+
+def test_parse_with_profile_resampling(stmt_grammar: Grammar):
+    stmt_id = stmt_grammar.parselets['stmt']
+    stmt_grammar.set_memoization(stmt_id, MemoizationMode.Auto)
+    profile = ParserProfile(min_lookups=2, max_skipped_calls=2)
+    parser = Parser(DefaultScanner(stmt_grammar, '<example>', 'a = 1; b = 2; c = 3; d = 4;'), profile=profile)
+    assert parser.parse(stmt_grammar.parselets['module']) == ('a', 'b', 'c', 'd')
+
+    # memoization is disabled after two lookups without hits, and it's sampled again after two skipped calls
+    assert profile.parselets[stmt_id].calls == 5
+    assert profile.parselets[stmt_id].lookups == 3
+    assert profile.is_memoized(stmt_id)
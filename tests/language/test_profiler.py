@@ -0,0 +1,75 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+import pytest
+
+from gvm.language.actions import make_call
+from gvm.language.grammar import Grammar, GrammarError
+from gvm.language.parser import Parser
+from gvm.language.profiler import profile_grammar, make_ordering
+from gvm.language.scanner import DefaultScanner
+
+
+def make_stmt(kind: str):
+    return make_call(lambda **kwargs: kind, str)
+
+
+@pytest.fixture
+def grammar() -> Grammar:
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'\s+'))
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9]*')
+    grammar.add_pattern(grammar.add_token('Number'), r'[0-9]+')
+
+    # stmt := 'pass' ';'
+    # stmt := 'print' value:Number ';'
+    # stmt := name:Name '=' value:Number ';'
+    grammar.add_parser('stmt', '"pass" ";"', make_stmt('pass'))
+    grammar.add_parser('stmt', '"print" value:Number ";"', make_stmt('print'))
+    grammar.add_parser('stmt', 'name:Name "=" value:Number ";"', make_stmt('assign'))
+    grammar.add_parser('module', 'stmts:{ stmt }', make_call(lambda stmts: stmts, tuple))
+    return grammar
+
+
+SOURCES = [
+    ('a.txt', 'a = 1; b = 2; print 3;'),
+    ('b.txt', 'c = 1; pass;'),
+]
+
+
+def test_profile_grammar(grammar: Grammar):
+    optimizer = grammar.optimizer
+    profile = profile_grammar(grammar, grammar.parselets['module'], SOURCES)
+    wins = [profile.wins[parselet] for parselet in grammar.tables[grammar.parselets['stmt']].parselets]
+    assert wins == [1, 1, 3]
+    assert grammar.is_optimized
+    assert grammar.optimizer is optimizer  # caches of grammar are not changed by profiling
+
+
+def test_make_ordering(grammar: Grammar):
+    profile = profile_grammar(grammar, grammar.parselets['module'], SOURCES)
+    ordering = make_ordering(grammar, profile)
+    assert ordering == {'stmt': [2, 0, 1]}
+
+    grammar.reorder_parselets(ordering)
+    parselets = grammar.tables[grammar.parselets['stmt']].parselets
+    assert [tuple(parselet.variables) for parselet in parselets] == [('name', 'value'), (), ('value',)]
+
+    parser = Parser(DefaultScanner(grammar, '<example>', 'a = 1; print 2; pass;'))
+    assert parser.parse(grammar.parselets['module']) == ('assign', 'print', 'pass')
+
+
+def test_make_ordering_overlapped(grammar: Grammar):
+    # alternatives with overlapped FIRST sets are not reordered
+    grammar.add_parser('stmt', 'name:Name ";"', make_stmt('expr'))
+    profile = profile_grammar(grammar, grammar.parselets['module'], SOURCES)
+    assert make_ordering(grammar, profile) == {}
+
+
+def test_reorder_parselets_unsafe(grammar: Grammar):
+    grammar.add_parser('stmt', 'name:Name ";"', make_stmt('expr'))
+    with pytest.raises(GrammarError):
+        grammar.reorder_parselets({'stmt': [3, 2, 1, 0]})
+    with pytest.raises(GrammarError):
+        grammar.reorder_parselets({'stmt': [0, 1]})
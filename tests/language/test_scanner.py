@@ -2,12 +2,16 @@
 #
 # This software may be modified and distributed under the terms
 # of the MIT license. See the LICENSE file for details.
+import re
 from typing import Sequence, Tuple
 
 import pytest
 
 from gvm.language.grammar import Grammar, TokenID
-from gvm.language.scanner import Scanner, DefaultScanner
+from gvm.language.scanner import Scanner, DefaultScanner, IndentationScanner, ParallelScanner, make_trie_pattern, \
+    make_start_pattern, is_ascii_compatible_pattern, ScannerCheckpoint
+from gvm.language.syntax import SyntaxToken
+from gvm.locations import Position
 
 
 def tokenize_to_tuple(scanner: Scanner) -> Sequence[Tuple[TokenID, str]]:
@@ -58,6 +62,14 @@ def test_tokenize_without_trivia(grammar: Grammar):
     )
 
 
+def test_tokenize_all(grammar: Grammar):
+    number_id = grammar.tokens['Number']
+    eof_id = grammar.tokens['<EOF>']
+
+    tokens = DefaultScanner(grammar, "<example>", "12 13").tokenize_all()
+    assert [(token.id, token.value) for token in tokens] == [(number_id, "12"), (number_id, "13"), (eof_id, "")]
+
+
 def test_tokenize_error(grammar: Grammar):
     error_id = grammar.tokens['<ERROR>']
     eof_id = grammar.tokens['<EOF>']
@@ -82,4 +94,296 @@ def test_tokenize_names(grammar: Grammar):
     assert tokenize_to_tuple(Scanner(grammar, "<example>", "whiles")) == ((name_id, "whiles"), (eof_id, ""))
     assert tokenize_to_tuple(Scanner(grammar, "<example>", "whil")) == ((name_id, "whil"), (eof_id, ""))
 
-# TODO: Add tests for indention scanner
+
+def test_tokenize_error_followed_by_token(grammar: Grammar):
+    error_id = grammar.tokens['<ERROR>']
+    number_id = grammar.tokens['Number']
+    eof_id = grammar.tokens['<EOF>']
+
+    assert tokenize_to_tuple(Scanner(grammar, "<example>", "?12")) == (
+        (error_id, "?"),
+        (number_id, "12"),
+        (eof_id, ""),
+    )
+
+
+def test_tokenize_error_run(grammar: Grammar):
+    error_id = grammar.tokens['<ERROR>']
+    number_id = grammar.tokens['Number']
+    name_id = grammar.tokens['Name']
+    eof_id = grammar.tokens['<EOF>']
+
+    assert tokenize_to_tuple(DefaultScanner(grammar, "<example>", "12?$?13 ?$?name ?$?")) == (
+        (number_id, "12"),
+        (error_id, "?$?"),
+        (number_id, "13"),
+        (error_id, "?$?"),
+        (name_id, "name"),
+        (error_id, "?$?"),
+        (eof_id, ""),
+    )
+
+
+def test_make_start_pattern():
+    patterns = [re.compile(r'[0-9]+'), re.compile(r'_*[^\W\d]\w*'), re.compile(r'(?:\+|-)?=')]
+    assert make_start_pattern(patterns) == r'[0-9_\+\-=]|[^\W\d]'
+    assert make_start_pattern([re.compile(r'[0-9]+'), re.compile(r'.')]) is None
+
+
+def test_tokenize_ascii(grammar: Grammar):
+    # non ASCII character disables fast path of scanner, e.g. tokens before it must be same
+    content = "for name1 + 12\n  while\x1c-\r\n\n-"
+    ascii_tokens = list(Scanner(grammar, "<example>", content))
+    unicode_tokens = list(Scanner(grammar, "<example>", content + "\u00e9"))
+    assert [(token.id, token.value, str(token.location)) for token in ascii_tokens[:-1]] == \
+           [(token.id, token.value, str(token.location)) for token in unicode_tokens[:-2]]
+
+
+def test_is_ascii_compatible_pattern():
+    assert is_ascii_compatible_pattern(re.compile(r'[^\W\d]\w*'))
+    assert not is_ascii_compatible_pattern(re.compile(r'\s+'))
+    assert not is_ascii_compatible_pattern(re.compile(r'a(?=[\S])'))
+    assert not is_ascii_compatible_pattern(re.compile('\u00e9'))
+
+
+def test_tokenize_locations(grammar: Grammar):
+    tokens = list(Scanner(grammar, "<example>", "12 \n 13\n\n"))
+    assert [str(token.location) for token in tokens] == [
+        '<example>:1:1-2',
+        '<example>:1:3-2:1',
+        '<example>:2:2-3',
+        '<example>:2:4-3:1',
+        '<example>:4:1',
+    ]
+    assert [(token.begin, token.end) for token in tokens] == [(0, 2), (2, 5), (5, 7), (7, 9), (9, 9)]
+    assert [token.value for token in tokens] == ['12', ' \n ', '13', '\n\n', '']
+
+
+def test_make_trie_pattern():
+    assert make_trie_pattern(['+', '+=', '++', '-']) == r'(?:\+(?:=|\+)?|\-)'
+    assert make_trie_pattern(['abc', 'abd']) == r'ab(?:c|d)'
+    assert make_trie_pattern(['a', 'abc']) == r'a(?:bc)?'
+
+
+def test_tokenize_literals(grammar: Grammar):
+    grammar.add_implicit("+=")
+    grammar.add_implicit("++")
+    grammar.add_implicit("+++=")
+    assert [item for _, item in grammar.scanner_table.patterns].count(None) == 1
+
+    tokens = tokenize_to_tuple(DefaultScanner(grammar, "<example>", "+ += ++ +++ +++= +-"))
+    assert tokens == (
+        (grammar.tokens['+'], "+"),
+        (grammar.tokens['+='], "+="),
+        (grammar.tokens['++'], "++"),
+        (grammar.tokens['++'], "++"),
+        (grammar.tokens['+'], "+"),
+        (grammar.tokens['+++='], "+++="),
+        (grammar.tokens['+'], "+"),
+        (grammar.tokens['-'], "-"),
+        (grammar.tokens['<EOF>'], ""),
+    )
+
+
+@pytest.mark.parametrize('is_optimized', [True, False])
+def test_tokenize_literals_with_priority(grammar: Grammar, is_optimized: bool):
+    # pattern with higher priority is won on same length, e.g. it splits literals to separate trie patterns
+    grammar.add_implicit("+=")
+    grammar.add_pattern(grammar.add_token('Operator'), r'[+\-]=?', priority=-2)
+    grammar.is_optimized = is_optimized
+    assert [item for _, item in grammar.scanner_table.patterns].count(None) == (1 if is_optimized else 2)
+
+    tokens = tokenize_to_tuple(DefaultScanner(grammar, "<example>", "for += + -"))
+    assert tokens == (
+        (grammar.tokens['for'], "for"),
+        (grammar.tokens['+='], "+="),
+        (grammar.tokens['Operator'], "+"),
+        (grammar.tokens['Operator'], "-"),
+        (grammar.tokens['<EOF>'], ""),
+    )
+
+
+def test_tokenize_keywords(grammar: Grammar):
+    name_id = grammar.tokens['Name']
+    grammar.add_keyword(name_id, 'def')
+    grammar.add_keyword(name_id, 'for')
+    assert all(item != grammar.tokens['def'] for _, item in grammar.scanner_table.patterns)
+
+    tokens = tokenize_to_tuple(DefaultScanner(grammar, "<example>", "def define for fore"))
+    assert tokens == (
+        (grammar.tokens['def'], "def"),
+        (name_id, "define"),
+        (grammar.tokens['for'], "for"),
+        (name_id, "fore"),
+        (grammar.tokens['<EOF>'], ""),
+    )
+
+
+def test_scan_token(grammar: Grammar):
+    scanner = DefaultScanner(grammar, "<example>", "for\n  12 form")
+    name_id = grammar.tokens['Name']
+
+    token = scanner.scan_token(0)
+    assert (token.id, token.value) == (grammar.tokens['for'], "for")
+    token = scanner.scan_token(0, name_id)
+    assert (token.id, token.value) == (name_id, "for")
+    assert str(token.location) == '<example>:1:1-3'
+
+    # expected tokens are not matched, therefore token is matched by all patterns
+    token = scanner.scan_token(3, name_id)
+    assert (token.id, token.value) == (grammar.tokens['Number'], "12")
+    assert str(token.location) == '<example>:2:3-4'
+
+    token = scanner.scan_token(13, {name_id})
+    assert token.id == grammar.tokens['<EOF>']
+    assert scanner.position == 0
+
+
+@pytest.fixture
+def indentation_grammar() -> Grammar:
+    grammar = Grammar()
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Whitespace'), r'[ \t]+'))
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Comment'), r'#[^\n]*'))
+    grammar.add_pattern(grammar.add_token('NewLine'), r'(\r?\n)+')
+    grammar.add_pattern(grammar.add_token('Name'), r'[a-zA-Z_][a-zA-Z0-9_]*')
+    grammar.add_brackets(grammar.add_implicit('('), grammar.add_implicit(')'))
+    grammar.add_implicit(':')
+    return grammar
+
+
+def tokenize_indentation(grammar: Grammar, content: str) -> Sequence[str]:
+    return [token.id.name if token.id.name in {'Indent', 'Dedend', 'NewLine'} else token.value
+            for token in IndentationScanner(grammar, "<example>", content)]
+
+
+def test_tokenize_indentation(indentation_grammar: Grammar):
+    content = "if a:\n    if b:\n        c\n    d\ne\n"
+    assert tokenize_indentation(indentation_grammar, content) == [
+        'if', 'a', ':', 'NewLine',
+        'Indent', 'if', 'b', ':', 'NewLine',
+        'Indent', 'c', 'NewLine',
+        'Dedend', 'd', 'NewLine',
+        'Dedend', 'e', 'NewLine',
+        '',
+    ]
+
+
+def test_tokenize_indentation_trivia_lines(indentation_grammar: Grammar):
+    # blank lines and lines with only comments are not changed indentation
+    content = "if a:\n    b\n\n        # comment\n  \n    c\n    # comment\nd"
+    assert tokenize_indentation(indentation_grammar, content) == [
+        'if', 'a', ':', 'NewLine',
+        'Indent', 'b', 'NewLine',
+        'c', 'NewLine',
+        'Dedend', 'd', 'NewLine',
+        '',
+    ]
+
+
+def test_tokenize_indentation_brackets(indentation_grammar: Grammar):
+    content = "a (\n  b\n    c)\n  d\n"
+    assert tokenize_indentation(indentation_grammar, content) == [
+        'a', '(', 'b', 'c', ')', 'NewLine',
+        'Indent', 'd', 'NewLine',
+        'Dedend', '',
+    ]
+
+
+def test_tokenize_indentation_locations(indentation_grammar: Grammar):
+    tokens = list(IndentationScanner(indentation_grammar, "<example>", "a\n  b\n"))
+    assert [(token.id.name, str(token.location)) for token in tokens] == [
+        ('Name', '<example>:1:1'),
+        ('NewLine', '<example>:1:2'),
+        ('Indent', '<example>:2:1-2'),
+        ('Name', '<example>:2:3'),
+        ('NewLine', '<example>:2:4'),
+        ('Dedend', '<example>:3:1'),
+        ('<EOF>', '<example>:3:1'),
+    ]
+
+
+def filter_tokens(tokens: Sequence[SyntaxToken], begin: int, end: int) -> Sequence[Tuple[TokenID, str, str]]:
+    return [(token.id, token.value, str(token.location)) for token in tokens
+            if token.begin < end and (token.end > begin or token.begin >= begin)]
+
+
+@pytest.mark.parametrize('is_recorded', [True, False])
+def test_tokenize_range(grammar: Grammar, is_recorded: bool):
+    content = "12 for\n+ 13\n\nwhile 14\n-\n15"
+    tokens = list(DefaultScanner(grammar, "<example>", content))
+
+    scanner = DefaultScanner(grammar, "<example>", content)
+    scanner.checkpoint_interval = 1
+    if is_recorded:
+        assert len(list(scanner)) == len(tokens)
+        assert [checkpoint.offset for checkpoint in scanner.checkpoints] == [0, 7, 13, 22, 24]
+
+    for begin, end in [(0, 3), (8, 14), (14, 15), (16, 26), (25, 40)]:
+        assert filter_tokens(list(scanner.tokenize_range(begin, end)), begin, end) == filter_tokens(tokens, begin, end)
+
+
+def test_tokenize_range_indented(grammar: Grammar):
+    # multi-line whitespaces are ended inside of next line, e.g. checkpoints are not placed at beginning of lines
+    content = 'def\n' + '    name\n' * 16
+    tokens = list(DefaultScanner(grammar, "<example>", content))
+
+    scanner = DefaultScanner(grammar, "<example>", content)
+    scanner.checkpoint_interval = 4
+    assert len(list(scanner)) == len(tokens)
+    assert len(scanner.checkpoints) > 1
+    assert [checkpoint.offset for checkpoint in scanner.checkpoints] == scanner.checkpoint_offsets
+
+    for begin, end in [(0, 10), (30, 40), (len(content) - 10, len(content))]:
+        assert filter_tokens(list(scanner.tokenize_range(begin, end)), begin, end) == filter_tokens(tokens, begin, end)
+
+
+def test_tokenize_indentation_range(indentation_grammar: Grammar):
+    content = "if a:\n    if b (\n  c):\n        d\n\n    e\nf\n"
+    tokens = list(IndentationScanner(indentation_grammar, "<example>", content))
+
+    scanner = IndentationScanner(indentation_grammar, "<example>", content)
+    scanner.checkpoint_interval = 1
+    assert len(list(scanner)) == len(tokens)
+    assert [checkpoint.state for checkpoint in scanner.checkpoints] == [
+        ((0,), 0, True),
+        ((0,), 0, True),
+        ((0, 4), 1, False),
+        ((0, 4), 0, True),
+        ((0, 4, 8), 0, True),
+        ((0, 4), 0, True),
+        ((0,), 0, True),
+    ]
+
+    for begin in range(len(content)):
+        end = begin + 8
+        assert filter_tokens(list(scanner.tokenize_range(begin, end)), begin, end) == filter_tokens(tokens, begin, end)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 16])
+def test_tokenize_parallel(grammar: Grammar, chunk_size: int):
+    grammar.add_trivia(grammar.add_pattern(grammar.add_token('Comment'), r'(?s)/\*.*?\*/'))
+    content = "12 for\n+ 13\n\n  while 14 /* comment\n\n\n\n\n\n\n\n */ name\n-\n15 ? ?\n\n"
+    tokens = list(DefaultScanner(grammar, "<example>", content))
+
+    scanner = ParallelScanner(grammar, "<example>", content)
+    scanner.chunk_size = chunk_size
+    scanner.workers = 2
+    assert len(scanner.get_chunk_offsets()) > 1
+    assert [(token.id, token.begin, token.value, str(token.location)) for token in scanner] == \
+           [(token.id, token.begin, token.value, str(token.location)) for token in tokens]
+    assert scanner.position == len(content)
+
+
+def test_tokenize_parallel_middle_of_line(grammar: Grammar):
+    content = "12 for\n+ 13\n\n  while 14\n-\n15\n"
+    checkpoint = ScannerCheckpoint(3, Position(1, 4))
+    expected = DefaultScanner(grammar, "<example>", content)
+    expected.restore(checkpoint)
+    tokens = list(expected)
+
+    scanner = ParallelScanner(grammar, "<example>", content)
+    scanner.chunk_size = 4
+    scanner.workers = 2
+    scanner.restore(checkpoint)
+    assert [(token.id, token.begin, token.value, str(token.location)) for token in scanner] == \
+           [(token.id, token.begin, token.value, str(token.location)) for token in tokens]
@@ -0,0 +1,32 @@
+# Copyright (C) 2019-2020 Vasiliy Sheredeko
+#
+# This software may be modified and distributed under the terms
+# of the MIT license. See the LICENSE file for details.
+import pytest
+
+from gvm.language.grammar import Grammar
+from gvm.language.syntax import SyntaxToken, NO_OFFSET
+from gvm.locations import Location
+
+
+def test_syntax_token():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+    location = Location('<example>')
+    token = SyntaxToken(name_id, 'name', location, begin=4, end=8)
+    assert (token.begin, token.end, token.value) == (4, 8, 'name')
+    assert token == SyntaxToken.from_buffer(name_id, 'def name', 4, 8, location)
+
+    with pytest.raises(ValueError):
+        SyntaxToken(name_id, 'name', location, begin=0, end=0)
+    with pytest.raises(ValueError):
+        SyntaxToken(name_id, 'name', location, end=4)
+
+
+def test_syntax_token_without_offsets():
+    grammar = Grammar()
+    name_id = grammar.add_token('Name')
+    location = Location('<example>')
+    token = SyntaxToken(name_id, 'name', location)
+    assert (token.begin, token.end, token.value) == (NO_OFFSET, NO_OFFSET, 'name')
+    assert token == SyntaxToken.from_buffer(name_id, 'def name', 4, 8, location)
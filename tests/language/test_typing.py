@@ -1,6 +1,9 @@
 from typing import Optional, Sequence, List
 
-from gvm.typing import unpack_type_argument, merge_sequence_type, make_optional_type, make_sequence_type, is_subclass
+import pytest
+
+from gvm.typing import unpack_type_argument, merge_sequence_type, make_optional_type, make_sequence_type, is_subclass, \
+    merge_choice_type
 
 
 def test_unpack_type_arguments():
@@ -34,6 +37,17 @@ def test_make_optional_type():
     assert make_optional_type(Sequence[int]) == Sequence[int]
 
 
+def test_merge_choice_type():
+    assert merge_choice_type(int, int) is int
+    assert merge_choice_type(int, bool) is int
+    assert merge_choice_type(bool, int) is int
+    assert merge_choice_type(int, str) is object
+    assert merge_choice_type(Optional[int], int) == Optional[int]
+    assert merge_choice_type(Sequence[int], Sequence[int]) == Sequence[int]
+    with pytest.raises(TypeError):
+        merge_choice_type(Sequence[int], int)
+
+
 def test_is_subclass():
     class_a = type('A', (), {})
     class_b = type('B', (class_a,), {})